@@ -12,12 +12,21 @@ from semantic_kernel.agents.strategies.selection.kernel_function_selection_strat
 from semantic_kernel.agents.strategies.termination.kernel_function_termination_strategy import KernelFunctionTerminationStrategy
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import AzureChatPromptExecutionSettings
-from semantic_kernel.connectors.ai.open_ai.services.azure_chat_completion import AzureChatCompletion
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
 from semantic_kernel.functions.kernel_function_from_prompt import KernelFunctionFromPrompt
 
 from local_python_plugin3 import LocalPythonPlugin  # Plugin for code execution
+from connector_registry import create_chat_completion, warm_up
+from orchestration_strategies import (
+    USER_TURN,
+    CachedSelectionStrategy,
+    CachedTerminationStrategy,
+    PredicateTerminationStrategy,
+    PromptHistoryReducer,
+    TransitionTableSelectionStrategy,
+    agent_produced_output,
+)
 
 # Load .env
 dotenv.load_dotenv()
@@ -38,7 +47,7 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 def _create_kernel(service_id: str) -> Kernel:
     kernel = Kernel()
     kernel.add_service(
-        AzureChatCompletion(
+        create_chat_completion(
             service_id=service_id,
             endpoint=azure_openai_endpoint,
             deployment_name=azure_openai_deployment,
@@ -148,26 +157,50 @@ History:
 
     )
 
-    chat = AgentGroupChat(
-        agents=[writer, executor],
-        selection_strategy=KernelFunctionSelectionStrategy(
+    cached_selection = CachedSelectionStrategy(
+        inner=KernelFunctionSelectionStrategy(
             function=selection,
             kernel=_create_kernel("selector"),
             #result_parser=lambda r: str(r.value[0]) if r.value else CODEWRITER_NAME,
             result_parser=safe_result_parser,
             agent_variable_name="agents",
             history_variable_name="history",
+            history_reducer=PromptHistoryReducer(target_count=6, mode="compact"),
         ),
-        termination_strategy=KernelFunctionTerminationStrategy(
+    )
+    cached_termination = CachedTerminationStrategy(
+        inner=KernelFunctionTerminationStrategy(
             agents=[executor],
             function=termination,
             kernel=_create_kernel("terminator"),
             result_parser=lambda r: TERMINATION_KEYWORD in str(r.value[0]).lower(),
             history_variable_name="history",
+            history_reducer=PromptHistoryReducer(target_count=2, mode="window"),
+        ),
+    )
+
+    chat = AgentGroupChat(
+        agents=[writer, executor],
+        selection_strategy=TransitionTableSelectionStrategy(
+            transitions={
+                USER_TURN: CODEWRITER_NAME,
+                CODEWRITER_NAME: CODEEXECUTOR_NAME,
+            },
+            # Only consulted for transitions the table does not define
+            fallback=cached_selection,
+        ),
+        termination_strategy=PredicateTerminationStrategy(
+            agents=[executor],
+            predicates=[agent_produced_output(CODEEXECUTOR_NAME)],
+            # Only consulted when every predicate is inconclusive
+            fallback=cached_termination,
             maximum_iterations=10,
         ),
     )
 
+    # Open the pooled connections now instead of on each agent's first call
+    await warm_up()
+
     print("🎯 Multi-Agent Python Assistant Ready. Type your request below:")
     print("Type `exit` to quit or `reset` to restart.\n")
 
@@ -177,6 +210,9 @@ History:
             break
         if user_input.lower() == "reset":
             await chat.reset()
+            # Only this chat's decisions; the cache is shared with every other chat in the process
+            cached_selection.forget()
+            cached_termination.forget()
             print("🔁 Conversation reset.\n")
             continue
 
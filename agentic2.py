@@ -4,24 +4,48 @@ import json
 import logging
 import os
 import uuid
-import tempfile
+from dataclasses import dataclass
+from typing import Callable
 
 import azure.functions as func
-from azure.identity import DefaultAzureCredential
+try:
+    # HTTP streaming for Azure Functions (Python v2 model); without it only the buffered route exists
+    from azurefunctions.extensions.http.fastapi import JSONResponse, Request, StreamingResponse
+    HTTP_STREAMING_AVAILABLE = True
+except ImportError:
+    HTTP_STREAMING_AVAILABLE = False
 from azure.core.exceptions import ClientAuthenticationError, HttpResponseError
-import requests
+import httpx
 
 from semantic_kernel import Kernel
-from semantic_kernel.agents import AgentGroupChat, ChatCompletionAgent
+from semantic_kernel.agents import AgentChat, AgentGroupChat, ChatCompletionAgent
 from semantic_kernel.agents.strategies.selection.kernel_function_selection_strategy import KernelFunctionSelectionStrategy
 from semantic_kernel.agents.strategies.termination.kernel_function_termination_strategy import KernelFunctionTerminationStrategy
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import AzureChatPromptExecutionSettings
-from semantic_kernel.connectors.ai.open_ai.services.azure_chat_completion import AzureChatCompletion
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.exceptions.agent_exceptions import AgentChatException
 from semantic_kernel.functions.kernel_function_from_prompt import KernelFunctionFromPrompt
 
+from artifact_store import get_artifact_store
+from connector_registry import create_chat_completion
+from execution_cache import shared_execution_cache
+from job_queue import FINISHED, JobQueueFull, JobScheduler
+from response_cache import config_fingerprint, shared_response_cache
+from session_leases import SessionLeaseManager
+from session_pool_client import get_session_pool_client
+from token_manager import MANAGEMENT_SCOPE, get_token_manager
+from orchestration_strategies import (
+    USER_TURN,
+    CachedSelectionStrategy,
+    CachedTerminationStrategy,
+    PredicateTerminationStrategy,
+    PromptHistoryReducer,
+    TransitionTableSelectionStrategy,
+    agent_produced_output,
+)
+
 # Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
@@ -32,13 +56,22 @@ azure_openai_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
 
 # Azure Container App Session Pool endpoint
 container_app_url = os.getenv("CONTAINER_APP_URL")
+code_execution_timeout = float(os.getenv("CODE_EXECUTION_TIMEOUT", "300"))
 
 CODEWRITER_NAME = "CodeWriter"
 CODEEXECUTOR_NAME = "CodeExecutor"
 TERMINATION_KEYWORD = "yes"
 
-# Use DefaultAzureCredential for Managed Identity
-default_credential = DefaultAzureCredential()
+# "chat": writer and executor agents take turns; "pipeline": the writer's code goes straight to the
+# sandbox once and the result is summarized by a template (the executor LLM only explains on request)
+DEFAULT_MODE = os.getenv("MULTIAGENT_MODE", "chat")
+MODES = ("chat", "pipeline")
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+# Upper bound for a request's "max_iterations"; every iteration is an LLM turn (and may run the sandbox)
+MAX_ITERATIONS_LIMIT = int(os.getenv("MULTIAGENT_MAX_ITERATIONS", "20"))
+
+# Receives progress events such as {"event": "message", "agent": ..., "content": ...}
+EventCallback = Callable[[dict], None]
 
 # Global cached kernels
 kernels = {}
@@ -48,7 +81,7 @@ def _create_kernel(service_id: str) -> Kernel:
         return kernels[service_id]
     kernel = Kernel()
     kernel.add_service(
-        AzureChatCompletion(
+        create_chat_completion(
             service_id=service_id,
             endpoint=azure_openai_endpoint,
             deployment_name=azure_openai_deployment,
@@ -71,31 +104,62 @@ def safe_result_parser(result):
         return CODEWRITER_NAME
     return None
 
-def get_container_app_token(scope: str = None):
+async def get_container_app_token(scope: str = None):
     try:
-        token = default_credential.get_token(scope or "https://management.azure.com/.default")
-        return token.token
+        # Served from the token manager's cache; it refreshes in the background before expiry
+        return await get_token_manager().get_token(scope or MANAGEMENT_SCOPE)
     except Exception as ex:
         logging.error(f"Failed to obtain managed identity token: {ex}")
         raise
 
-def execute_code_in_container(code: str):
-    """Send code to Azure Container App session pool for execution."""
-    token = get_container_app_token()
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    payload = {"code": code}
+async def _warm_session(session_id: str) -> None:
+    token = await get_container_app_token()
+    await get_session_pool_client().execute(container_app_url, "pass", token, identifier=session_id)
+
+# One dynamic session per conversation, so the fix-and-rerun loop keeps its interpreter state
+session_leases = SessionLeaseManager(warm=_warm_session)
+
+async def execute_code_in_container(
+    code: str, timeout: float | None = None, conversation_id: str | None = None, use_cache: bool = True
+):
+    """Send code to Azure Container App session pool for execution without blocking the event loop."""
+    # The writer often resubmits identical code; deterministic code is answered from the cache
+    if use_cache:
+        cached = shared_execution_cache.get(code, container_app_url)
+        if cached is not None:
+            return cached
+    token = await get_container_app_token()
     try:
-        resp = requests.post(container_app_url, headers=headers, json=payload, timeout=300)
-        resp.raise_for_status()
-        return resp.json()
-    except (requests.RequestException, HttpResponseError) as e:
+        result = await get_session_pool_client().execute(
+            container_app_url, code, token,
+            timeout=timeout or code_execution_timeout,
+            identifier=session_leases.acquire(conversation_id),
+        )
+        if use_cache:
+            shared_execution_cache.put(code, container_app_url, result)
+        return result
+    except (httpx.HTTPError, HttpResponseError, asyncio.TimeoutError) as e:
         logging.error(f"Error executing code in container app: {e}")
         raise
 
-async def run_multi_agent(prompt: str, max_iterations: int = 10):
+@dataclass(frozen=True)
+class AgentComponents:
+    """Immutable pieces of the multi-agent chat, built once per worker and shared by all requests."""
+    writer: ChatCompletionAgent
+    executor: ChatCompletionAgent
+    explainer: ChatCompletionAgent
+    selection: KernelFunctionFromPrompt
+    termination: KernelFunctionFromPrompt
+    selector_kernel: Kernel
+    terminator_kernel: Kernel
+
+# Built on the first request; the lock keeps concurrent first requests from building it twice
+_components: AgentComponents | None = None
+_components_lock = asyncio.Lock()
+# Held so the prefetch task is not garbage collected mid-flight
+_token_prefetch: asyncio.Task | None = None
+
+def _build_components() -> AgentComponents:
     writer = ChatCompletionAgent(
         service_id=CODEWRITER_NAME,
         kernel=_create_kernel(CODEWRITER_NAME),
@@ -131,6 +195,24 @@ You are an execution agent named {CODEEXECUTOR_NAME}.
         ),
     )
 
+    # Pipeline mode only: explains an execution result it did not have to produce itself
+    explainer = ChatCompletionAgent(
+        service_id=CODEEXECUTOR_NAME,
+        kernel=_create_kernel(CODEEXECUTOR_NAME),
+        name=CODEEXECUTOR_NAME,
+        instructions=f"""
+You are an execution agent named {CODEEXECUTOR_NAME}.
+- The code has already been executed; the last message is its execution result.
+- Explain the result in two or three plain sentences. Do not invent outputs.
+""",
+        execution_settings=AzureChatPromptExecutionSettings(
+            service_id=CODEEXECUTOR_NAME,
+            temperature=0.2,
+            max_tokens=300,
+            function_choice_behavior=FunctionChoiceBehavior.NoneInvoke(),
+        ),
+    )
+
     selection = KernelFunctionFromPrompt(
         function_name="select_next",
         prompt=f"""
@@ -165,55 +247,330 @@ History:
 """
     )
 
-    chat = AgentGroupChat(
+    return AgentComponents(
+        writer=writer,
+        executor=executor,
+        explainer=explainer,
+        selection=selection,
+        termination=termination,
+        selector_kernel=_create_kernel("selector"),
+        terminator_kernel=_create_kernel("terminator"),
+    )
+
+async def get_components() -> AgentComponents:
+    global _components, _token_prefetch
+    if _components is None:
+        async with _components_lock:
+            if _components is None:
+                _components = _build_components()
+                logging.info("Built agent components for this worker")
+                # Fetch the session pool token while the first chat runs instead of on its first execution
+                _token_prefetch = asyncio.create_task(get_token_manager().prefetch(MANAGEMENT_SCOPE))
+    return _components
+
+def _create_chat(components: AgentComponents, max_iterations: int) -> AgentGroupChat:
+    """A fresh chat (history and strategy state) around the shared components."""
+    writer, executor = components.writer, components.executor
+    return AgentGroupChat(
         agents=[writer, executor],
-        selection_strategy=KernelFunctionSelectionStrategy(
-            function=selection,
-            kernel=_create_kernel("selector"),
-            result_parser=safe_result_parser,
-            agent_variable_name="agents",
-            history_variable_name="history",
+        selection_strategy=TransitionTableSelectionStrategy(
+            transitions={
+                USER_TURN: CODEWRITER_NAME,
+                CODEWRITER_NAME: CODEEXECUTOR_NAME,
+            },
+            # Only consulted for transitions the table does not define
+            fallback=CachedSelectionStrategy(
+                inner=KernelFunctionSelectionStrategy(
+                    function=components.selection,
+                    kernel=components.selector_kernel,
+                    result_parser=safe_result_parser,
+                    agent_variable_name="agents",
+                    history_variable_name="history",
+                    history_reducer=PromptHistoryReducer(target_count=6, mode="compact"),
+                ),
+            ),
         ),
-        termination_strategy=KernelFunctionTerminationStrategy(
+        termination_strategy=PredicateTerminationStrategy(
             agents=[executor],
-            function=termination,
-            kernel=_create_kernel("terminator"),
-            result_parser=lambda r: TERMINATION_KEYWORD in str(r.value[0]).lower(),
-            history_variable_name="history",
+            predicates=[agent_produced_output(CODEEXECUTOR_NAME)],
+            # Only consulted when every predicate is inconclusive
+            fallback=CachedTerminationStrategy(
+                inner=KernelFunctionTerminationStrategy(
+                    agents=[executor],
+                    function=components.termination,
+                    kernel=components.terminator_kernel,
+                    result_parser=lambda r: TERMINATION_KEYWORD in str(r.value[0]).lower(),
+                    history_variable_name="history",
+                    history_reducer=PromptHistoryReducer(target_count=2, mode="window"),
+                ),
+            ),
             maximum_iterations=max_iterations,
         ),
     )
 
+async def _save_code(code: str) -> dict:
+    """Store code for download; identical code is stored once and old files are evicted."""
+    artifact = await get_artifact_store().put(code, extension="py")
+    return {"code_file": artifact.path, "artifact": artifact.to_dict(), "code": code}
+
+def render_execution_summary(exec_result) -> str:
+    """Plain-text report of a session pool execution result, in place of an executor LLM turn."""
+    properties = exec_result.get("properties", exec_result) if isinstance(exec_result, dict) else {}
+    status = properties.get("status", "Unknown")
+    lines = [f"Execution status: {status}"]
+    for label, key in (("Output", "stdout"), ("Errors", "stderr"), ("Result", "executionResult")):
+        value = properties.get(key)
+        if value not in (None, "", [], {}):
+            lines.append(f"{label}:\n{value if isinstance(value, str) else json.dumps(value, default=str)}")
+    if "executionTimeInMilliseconds" in properties:
+        lines.append(f"Execution time: {properties['executionTimeInMilliseconds']} ms")
+    if not isinstance(exec_result, dict):
+        lines.append(f"Result:\n{exec_result}")
+    return "\n".join(lines)
+
+def _emit(on_event: EventCallback | None, event: str, **data) -> None:
+    if on_event is not None:
+        on_event({"event": event, **data})
+
+async def _agent_turns(chat: AgentGroupChat, agent=None, on_event: EventCallback | None = None, stream_tokens: bool = False):
+    """Yield complete (agent name, content) turns; with stream_tokens, token deltas are emitted as they arrive."""
+    if not stream_tokens:
+        async for response in chat.invoke(agent) if agent else chat.invoke():
+            _emit(on_event, "message", agent=response.name, content=response.content)
+            yield response.name, response.content
+        return
+
+    async def _stream_turn(chunks):
+        name, parts = None, []
+        async for chunk in chunks:
+            name = chunk.name or name
+            if chunk.content:
+                parts.append(chunk.content)
+                _emit(on_event, "delta", agent=name, content=chunk.content)
+        return name, "".join(parts)
+
+    if agent is not None:
+        name, content = await _stream_turn(chat.invoke_stream(agent))
+        if content:
+            _emit(on_event, "message", agent=name, content=content)
+            yield name, content
+        return
+
+    # AgentGroupChat.invoke_stream, one turn at a time: each turn is yielded (and e.g. its code run)
+    # as soon as its stream ends, not when the next agent's first chunk arrives with that stream open
+    for _ in range(chat.termination_strategy.maximum_iterations):
+        try:
+            selected = await chat.selection_strategy.next(chat.agents, chat.history.messages)
+        except Exception as ex:
+            raise AgentChatException("Failed to select agent") from ex
+        name, content = await _stream_turn(AgentChat.invoke_agent_stream(chat, selected))
+        if content:
+            _emit(on_event, "message", agent=name or selected.name, content=content)
+            yield name or selected.name, content
+        chat.is_complete = await chat.termination_strategy.should_terminate(selected, chat.history.messages)
+        if chat.is_complete:
+            break
+
+async def _execute_generated_code(
+    code: str, conversation_id: str, on_event: EventCallback | None, use_cache: bool = True
+) -> dict:
+    code_output = await _save_code(code)
+    _emit(on_event, "artifact", artifact=code_output["artifact"])
+    # Execute in container
+    code_output["execution_result"] = await execute_code_in_container(
+        code, conversation_id=conversation_id, use_cache=use_cache
+    )
+    _emit(on_event, "execution_result", execution_result=code_output["execution_result"])
+    return code_output
+
+async def run_pipeline(
+    prompt: str,
+    conversation_id: str,
+    explain: bool = False,
+    on_event: EventCallback | None = None,
+    stream_tokens: bool = False,
+    use_cache: bool = True,
+):
+    """One writer turn, one sandbox run and a template summary: no executor LLM turn, no duplicate run."""
+    components = await get_components()
+    chat = AgentGroupChat(agents=[components.writer])
+    await chat.add_chat_message(ChatMessageContent(role=AuthorRole.USER, content=prompt))
+
+    code = None
+    async for _, content in _agent_turns(chat, components.writer, on_event, stream_tokens):
+        code = content
+    if not code:
+        return None
+
+    code_output = await _execute_generated_code(code, conversation_id, on_event, use_cache)
+    summary = render_execution_summary(code_output["execution_result"])
+    code_output["summary"] = summary
+    _emit(on_event, "summary", content=summary)
+
+    if explain:
+        await chat.add_chat_message(ChatMessageContent(role=AuthorRole.ASSISTANT, name=CODEEXECUTOR_NAME, content=summary))
+        async for _, content in _agent_turns(chat, components.explainer, on_event, stream_tokens):
+            code_output["explanation"] = content
+    return code_output
+
+async def run_multi_agent(
+    prompt: str,
+    max_iterations: int = 10,
+    conversation_id: str | None = None,
+    mode: str = DEFAULT_MODE,
+    explain: bool = False,
+    on_event: EventCallback | None = None,
+    stream_tokens: bool = False,
+):
+    """
+    Run the writer/executor agents on `prompt` and return the generated code and its execution result.
+    `on_event` receives progress events (agent messages, token deltas when `stream_tokens` is set,
+    the stored artifact and the execution result) as they happen.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+    # Callers that pass a conversation_id keep its session across requests; otherwise it ends with the request
+    keep_session = conversation_id is not None
+    # A kept session carries state (variables, files) between requests, so its results are not interchangeable
+    use_cache = not keep_session
+    conversation_id = conversation_id or uuid.uuid4().hex
+    try:
+        if mode == "pipeline":
+            return await run_pipeline(prompt, conversation_id, explain, on_event, stream_tokens, use_cache)
+        return await _run_chat(prompt, max_iterations, conversation_id, on_event, stream_tokens, use_cache)
+    finally:
+        if not keep_session:
+            session_leases.release(conversation_id)
+
+async def _run_chat(
+    prompt: str,
+    max_iterations: int,
+    conversation_id: str,
+    on_event: EventCallback | None = None,
+    stream_tokens: bool = False,
+    use_cache: bool = True,
+):
+    chat = _create_chat(await get_components(), max_iterations)
     await chat.add_chat_message(ChatMessageContent(role=AuthorRole.USER, content=prompt))
 
     code_output = None
-    async for response in chat.invoke():
-        if response.name == CODEWRITER_NAME:
-            # Save code to temp file for download
-            code = response.content
-            file_name = f"generated_{uuid.uuid4().hex}.py"
-            file_path = os.path.join(tempfile.gettempdir(), file_name)
-            with open(file_path, 'w') as f:
-                f.write(code)
-            code_output = {"code_file": file_path, "code": code}
-            # Execute in container
-            exec_result = execute_code_in_container(code)
-            code_output["execution_result"] = exec_result
+    async for name, content in _agent_turns(chat, on_event=on_event, stream_tokens=stream_tokens):
+        if name == CODEWRITER_NAME:
+            code_output = await _execute_generated_code(content, conversation_id, on_event, use_cache)
 
     return code_output
 
+async def run_request(request: dict, on_event: EventCallback | None = None, stream_tokens: bool = False):
+    """
+    run_multi_agent with the arguments of a parsed /multiagent request body, served from the response
+    cache when the same prompt and configuration ran recently (or is running right now).
+    "no_cache": true bypasses the cache; so does a conversation_id, whose sandbox session carries state.
+    """
+    max_iterations = int(request.get("max_iterations", 10))
+    mode = request.get("mode", DEFAULT_MODE)
+    explain = bool(request.get("explain", False))
+
+    def run(emit: EventCallback | None):
+        return run_multi_agent(
+            request["prompt"],
+            max_iterations,
+            request.get("conversation_id"),
+            mode,
+            explain,
+            on_event=emit,
+            stream_tokens=stream_tokens,
+        )
+
+    if request.get("no_cache") or request.get("conversation_id"):
+        return await run(on_event)
+    key = shared_response_cache.key(request["prompt"], await _response_fingerprint(mode, max_iterations, explain))
+    # A coalesced caller receives the shared run's events too (with token deltas only if the first caller streamed)
+    result, status = await shared_response_cache.get_or_run(key, run, on_event)
+    if status != "miss":
+        logging.info(f"Response cache {status}; {shared_response_cache.summary()}")
+        _emit(on_event, "cache", status=status)
+    return result
+
+async def _response_fingerprint(mode: str, max_iterations: int, explain: bool) -> str:
+    components = await get_components()
+    return config_fingerprint(
+        azure_openai_endpoint,
+        azure_openai_deployment,
+        container_app_url,
+        code_execution_timeout,
+        [a.instructions for a in (components.writer, components.executor, components.explainer)],
+        mode,
+        max_iterations,
+        explain,
+    )
+
+async def stream_multi_agent(request: dict, stream_format: str = "ndjson"):
+    """
+    Run the agents for a parsed request body and yield the encoded events as they happen,
+    ending with a "done" event carrying the same result the buffered route returns.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    run = asyncio.create_task(run_request(request, events.put_nowait, stream_tokens=True))
+    run.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while (event := await events.get()) is not None:
+            yield _encode_event(event, stream_format)
+        try:
+            yield _encode_event({"event": "done", "result": run.result()}, stream_format)
+        except Exception as e:
+            logging.exception("Unhandled exception in streamed run")
+            yield _encode_event({"event": "error", "error": str(e)}, stream_format)
+    finally:
+        # The client went away: stop the agents (a run shared through the response cache keeps going for the others)
+        run.cancel()
+
+def _encode_event(event: dict, stream_format: str) -> str:
+    data = json.dumps(event, default=str)
+    if stream_format == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+_job_scheduler: JobScheduler | None = None
+
+def get_job_scheduler() -> JobScheduler:
+    global _job_scheduler
+    if _job_scheduler is None:
+        _job_scheduler = JobScheduler(run_request)
+    return _job_scheduler
+
+def _json_response(body, status_code: int = 200) -> func.HttpResponse:
+    return func.HttpResponse(json.dumps(body, default=str), status_code=status_code, mimetype="application/json")
+
+def _request_error(body) -> str | None:
+    if not isinstance(body, dict):
+        return "Request body must be a JSON object"
+    if not body.get("prompt"):
+        return "Missing 'prompt' in request body"
+    if not isinstance(body["prompt"], str):
+        return "'prompt' must be a string"
+    mode = body.get("mode", DEFAULT_MODE)
+    if not isinstance(mode, str) or mode not in MODES:
+        return f"'mode' must be one of {list(MODES)}"
+    if body.get("stream") is not None and not isinstance(body["stream"], str):
+        return f"'stream' must be one of {list(STREAM_FORMATS)}"
+    max_iterations = body.get("max_iterations", 10)
+    if isinstance(max_iterations, str) and max_iterations.strip().isdigit():
+        max_iterations = int(max_iterations)
+    if isinstance(max_iterations, bool) or not isinstance(max_iterations, int) or not 1 <= max_iterations <= MAX_ITERATIONS_LIMIT:
+        return f"'max_iterations' must be an integer from 1 to {MAX_ITERATIONS_LIMIT}"
+    return None
+
 async def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
-        body = req.get_json()
-        prompt = body.get("prompt")
-        max_iterations = int(body.get("max_iterations", 10))
-        if not prompt:
-            return func.HttpResponse(
-                json.dumps({"error": "Missing 'prompt' in request body"}),
-                status_code=400,
-                mimetype="application/json"
-            )
-        result = await run_multi_agent(prompt, max_iterations)
+        try:
+            body = req.get_json()
+        except ValueError:
+            return _json_response({"error": "Request body must be JSON"}, 400)
+        error = _request_error(body)
+        if error:
+            return _json_response({"error": error}, 400)
+        result = await run_request(body)
         return func.HttpResponse(
             json.dumps(result, default=str),
             status_code=200,
@@ -228,7 +585,74 @@ async def main(req: func.HttpRequest) -> func.HttpResponse:
 # The Azure Functions entry point
 app = func.FunctionApp()
 
+@app.function_name(name="ArtifactDownload")
+@app.route(route="artifacts/{artifact_id}", methods=["GET"])
+async def artifact_download(req: func.HttpRequest) -> func.HttpResponse:
+    artifact_id = req.route_params.get("artifact_id", "")
+    data = await get_artifact_store().read(artifact_id)
+    if data is None:
+        return func.HttpResponse(json.dumps({"error": "Artifact not found"}), status_code=404, mimetype="application/json")
+    return func.HttpResponse(
+        data,
+        status_code=200,
+        mimetype="text/x-python",
+        headers={"Content-Disposition": f'attachment; filename="{artifact_id}"'},
+    )
+
 @app.function_name(name="MultiAgentFunction")
 @app.route(route="multiagent", methods=["POST"])
 async def multiagent_function(req: func.HttpRequest) -> func.HttpResponse:
     return await main(req)
+
+if HTTP_STREAMING_AVAILABLE:
+    @app.function_name(name="MultiAgentStreamFunction")
+    @app.route(route="multiagent/stream", methods=["POST"])
+    async def multiagent_stream_function(req: Request) -> StreamingResponse:
+        """Same body as /multiagent, answered with NDJSON (default) or SSE ("stream": "sse" or Accept: text/event-stream)."""
+        try:
+            body = await req.json()
+        except ValueError:
+            return JSONResponse({"error": "Request body must be JSON"}, status_code=400)
+        error = _request_error(body)
+        if error:
+            return JSONResponse({"error": error}, status_code=400)
+        stream_format = body.get("stream") or ("sse" if "text/event-stream" in req.headers.get("accept", "") else "ndjson")
+        if stream_format not in STREAM_FORMATS:
+            return JSONResponse({"error": f"'stream' must be one of {list(STREAM_FORMATS)}"}, status_code=400)
+        return StreamingResponse(stream_multi_agent(body, stream_format), media_type=STREAM_FORMATS[stream_format])
+
+@app.function_name(name="MultiAgentJobSubmit")
+@app.route(route="multiagent/jobs", methods=["POST"])
+async def multiagent_job_submit(req: func.HttpRequest) -> func.HttpResponse:
+    """Queue a run with the /multiagent body; answers 202 with the job id to poll instead of holding the connection."""
+    try:
+        body = req.get_json()
+    except ValueError:
+        return _json_response({"error": "Request body must be JSON"}, 400)
+    error = _request_error(body)
+    if error:
+        return _json_response({"error": error}, 400)
+    try:
+        job = await get_job_scheduler().submit(body)
+    except JobQueueFull as e:
+        return _json_response({"error": f"Too many queued jobs: {e}"}, 503)
+    return func.HttpResponse(
+        json.dumps({"job_id": job.id, "status": job.status}),
+        status_code=202,
+        mimetype="application/json",
+        headers={"Location": f"/api/multiagent/jobs/{job.id}"},
+    )
+
+@app.function_name(name="MultiAgentJob")
+@app.route(route="multiagent/jobs/{job_id}", methods=["GET", "DELETE"])
+async def multiagent_job(req: func.HttpRequest) -> func.HttpResponse:
+    """GET: status, progress events, partial and final results. DELETE: cancel a queued or running job."""
+    job_id = req.route_params.get("job_id", "")
+    scheduler = get_job_scheduler()
+    job = await (scheduler.cancel(job_id) if req.method == "DELETE" else scheduler.get(job_id))
+    if job is None:
+        return _json_response({"error": "Job not found"}, 404)
+    if req.method == "DELETE" and job.status not in FINISHED:
+        # Running on another worker that shares the SQLite store; only that worker can stop it
+        return _json_response({"error": "Job is running on another worker", "job": job.to_dict()}, 409)
+    return _json_response(job.to_dict())
@@ -1,12 +1,8 @@
 import asyncio
 import os
-import uuid
-import tempfile
 import json
 import logging
-import requests
 
-from azure.identity import DefaultAzureCredential
 from azure.core.exceptions import ClientAuthenticationError, HttpResponseError
 
 from semantic_kernel import Kernel
@@ -15,11 +11,24 @@ from semantic_kernel.agents.strategies.selection.kernel_function_selection_strat
 from semantic_kernel.agents.strategies.termination.kernel_function_termination_strategy import KernelFunctionTerminationStrategy
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import AzureChatPromptExecutionSettings
-from semantic_kernel.connectors.ai.open_ai.services.azure_chat_completion import AzureChatCompletion
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
 from semantic_kernel.functions.kernel_function_from_prompt import KernelFunctionFromPrompt
 
+from artifact_store import get_artifact_store
+from connector_registry import create_chat_completion
+from session_pool_client import get_session_pool_client
+from token_manager import MANAGEMENT_SCOPE, get_token_manager
+from orchestration_strategies import (
+    USER_TURN,
+    CachedSelectionStrategy,
+    CachedTerminationStrategy,
+    PredicateTerminationStrategy,
+    PromptHistoryReducer,
+    TransitionTableSelectionStrategy,
+    agent_produced_output,
+)
+
 logging.basicConfig(level=logging.INFO)
 
 azure_openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "")
@@ -31,7 +40,6 @@ CODEWRITER_NAME = "CodeWriter"
 CODEEXECUTOR_NAME = "CodeExecutor"
 TERMINATION_KEYWORD = "yes"
 
-default_credential = DefaultAzureCredential()
 kernels = {}
 
 def _create_kernel(service_id: str) -> Kernel:
@@ -39,7 +47,7 @@ def _create_kernel(service_id: str) -> Kernel:
         return kernels[service_id]
     kernel = Kernel()
     kernel.add_service(
-        AzureChatCompletion(
+        create_chat_completion(
             service_id=service_id,
             endpoint=azure_openai_endpoint,
             deployment_name=azure_openai_deployment,
@@ -62,20 +70,12 @@ def safe_result_parser(result):
         return CODEWRITER_NAME
     return None
 
-def get_container_app_token(scope: str = None):
-    token = default_credential.get_token(scope or "https://management.azure.com/.default")
-    return token.token
-
-def execute_code_in_container(code: str):
-    token = get_container_app_token()
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    payload = {"code": code}
-    resp = requests.post(container_app_url, headers=headers, json=payload, timeout=300)
-    resp.raise_for_status()
-    return resp.json()
+async def get_container_app_token(scope: str = None):
+    return await get_token_manager().get_token(scope or MANAGEMENT_SCOPE)
+
+async def execute_code_in_container(code: str, timeout: float | None = None):
+    token = await get_container_app_token()
+    return await get_session_pool_client().execute(container_app_url, code, token, timeout=timeout)
 
 async def run_multi_agent(prompt: str, max_iterations: int = 10):
     writer = ChatCompletionAgent(
@@ -138,19 +138,37 @@ History:
 
     chat = AgentGroupChat(
         agents=[writer, executor],
-        selection_strategy=KernelFunctionSelectionStrategy(
-            function=selection,
-            kernel=_create_kernel("selector"),
-            result_parser=safe_result_parser,
-            agent_variable_name="agents",
-            history_variable_name="history",
+        selection_strategy=TransitionTableSelectionStrategy(
+            transitions={
+                USER_TURN: CODEWRITER_NAME,
+                CODEWRITER_NAME: CODEEXECUTOR_NAME,
+            },
+            # Only consulted for transitions the table does not define
+            fallback=CachedSelectionStrategy(
+                inner=KernelFunctionSelectionStrategy(
+                    function=selection,
+                    kernel=_create_kernel("selector"),
+                    result_parser=safe_result_parser,
+                    agent_variable_name="agents",
+                    history_variable_name="history",
+                    history_reducer=PromptHistoryReducer(target_count=6, mode="compact"),
+                ),
+            ),
         ),
-        termination_strategy=KernelFunctionTerminationStrategy(
+        termination_strategy=PredicateTerminationStrategy(
             agents=[executor],
-            function=termination,
-            kernel=_create_kernel("terminator"),
-            result_parser=lambda r: TERMINATION_KEYWORD in str(r.value[0]).lower(),
-            history_variable_name="history",
+            predicates=[agent_produced_output(CODEEXECUTOR_NAME)],
+            # Only consulted when every predicate is inconclusive
+            fallback=CachedTerminationStrategy(
+                inner=KernelFunctionTerminationStrategy(
+                    agents=[executor],
+                    function=termination,
+                    kernel=_create_kernel("terminator"),
+                    result_parser=lambda r: TERMINATION_KEYWORD in str(r.value[0]).lower(),
+                    history_variable_name="history",
+                    history_reducer=PromptHistoryReducer(target_count=2, mode="window"),
+                ),
+            ),
             maximum_iterations=max_iterations,
         ),
     )
@@ -161,12 +179,10 @@ History:
     async for response in chat.invoke():
         if response.name == CODEWRITER_NAME:
             code = response.content
-            file_name = f"generated_{uuid.uuid4().hex}.py"
-            file_path = os.path.join(tempfile.gettempdir(), file_name)
-            with open(file_path, 'w') as f:
-                f.write(code)
-            code_output = {"code_file": file_path, "code": code}
-            exec_result = execute_code_in_container(code)
+            # Content-addressed: identical code is stored once and old files are evicted
+            artifact = await get_artifact_store().put(code, extension="py")
+            code_output = {"code_file": artifact.path, "artifact": artifact.to_dict(), "code": code}
+            exec_result = await execute_code_in_container(code)
             code_output["execution_result"] = exec_result
     return code_output
 
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", os.path.join(tempfile.gettempdir(), "generated_code"))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(200 * 1024 ** 2)))
+ARTIFACT_MAX_AGE_SECONDS = float(os.getenv("ARTIFACT_MAX_AGE_SECONDS", str(24 * 3600)))
+# Prefix for download links in responses, e.g. "/api/artifacts"
+ARTIFACT_BASE_URL = os.getenv("ARTIFACT_BASE_URL", "/api/artifacts")
+
+# Handles are "<sha256>.<ext>", which also keeps callers from reaching outside the store
+HANDLE_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]{1,8}$")
+
+
+@dataclass
+class Artifact:
+    id: str
+    size: int
+    path: str
+
+    @property
+    def download_url(self) -> str:
+        return f"{ARTIFACT_BASE_URL}/{self.id}"
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "size": self.size, "download_url": self.download_url}
+
+
+class LocalDirectoryBackend:
+    """Stores artifacts as files in one directory; file mtimes double as last-used times."""
+
+    def __init__(self, root: str = ARTIFACT_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self.path(name))
+
+    def write(self, name: str, data: bytes) -> None:
+        # Write then rename, so readers never see a partial file
+        fd, staging = tempfile.mkstemp(dir=self.root, prefix=".staging-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(staging, self.path(name))
+        except BaseException:
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+
+    def read(self, name: str) -> bytes | None:
+        try:
+            with open(self.path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def touch(self, name: str) -> None:
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def list(self) -> list[tuple[str, int, float]]:
+        """(name, size, last used) of every stored artifact."""
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file() and HANDLE_PATTERN.match(entry.name):
+                    stat = entry.stat()
+                    entries.append((entry.name, stat.st_size, stat.st_mtime))
+        return entries
+
+
+class ArtifactStore:
+    """
+    Content-addressed store for generated files: identical content is stored once under its hash.
+    Writes and eviction run off the event loop. Artifacts unused for `max_age` seconds are removed,
+    then the least recently used ones until the store fits in `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        backend: LocalDirectoryBackend | None = None,
+        max_bytes: int = ARTIFACT_MAX_BYTES,
+        max_age: float = ARTIFACT_MAX_AGE_SECONDS,
+    ):
+        self.backend = backend or LocalDirectoryBackend()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._writing: dict[str, asyncio.Task] = {}
+        self._evicting: asyncio.Task | None = None
+
+    async def put(self, content: str | bytes, extension: str = "py") -> Artifact:
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        if self.backend.exists(name):
+            await asyncio.to_thread(self.backend.touch, name)
+        else:
+            # Identical content submitted concurrently is written once
+            task = self._writing.get(name)
+            if task is None:
+                task = asyncio.create_task(asyncio.to_thread(self.backend.write, name, data))
+                self._writing[name] = task
+                task.add_done_callback(lambda _: self._writing.pop(name, None))
+            await asyncio.shield(task)
+            self._schedule_eviction()
+        return Artifact(id=name, size=len(data), path=self.backend.path(name))
+
+    async def read(self, artifact_id: str) -> bytes | None:
+        if not HANDLE_PATTERN.match(artifact_id):
+            return None
+        return await asyncio.to_thread(self.backend.read, artifact_id)
+
+    def _schedule_eviction(self) -> None:
+        if self._evicting is None or self._evicting.done():
+            self._evicting = asyncio.create_task(asyncio.to_thread(self.evict))
+
+    def evict(self) -> None:
+        entries = self.backend.list()
+        cutoff = time.time() - self.max_age
+        kept = []
+        for name, size, last_used in entries:
+            if last_used < cutoff:
+                self.backend.delete(name)
+            else:
+                kept.append((last_used, name, size))
+        total = sum(size for _, _, size in kept)
+        removed = len(entries) - len(kept)
+        for _, name, size in sorted(kept):
+            if total <= self.max_bytes:
+                break
+            self.backend.delete(name)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"Evicted {removed} artifacts; {total / 1024 ** 2:.1f} MiB kept")
+
+
+_store: ArtifactStore | None = None
+
+
+def get_artifact_store() -> ArtifactStore:
+    global _store
+    if _store is None:
+        _store = ArtifactStore()
+    return _store
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import threading
+
+import httpx
+from openai import AsyncAzureOpenAI
+from semantic_kernel.connectors.ai.open_ai.const import DEFAULT_AZURE_API_VERSION
+from semantic_kernel.connectors.ai.open_ai.services.azure_chat_completion import AzureChatCompletion
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# One pooled async client per (endpoint, deployment, api_version), shared by every kernel in the process
+_clients: dict[tuple[str, str, str], AsyncAzureOpenAI] = {}
+_http_clients: dict[tuple[str, str, str], httpx.AsyncClient] = {}
+_lock = threading.Lock()
+
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=120)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+
+def get_async_client(endpoint: str, deployment_name: str, api_key: str | None = None, api_version: str | None = None) -> AsyncAzureOpenAI:
+    """Return the process-wide AsyncAzureOpenAI client for this endpoint/deployment, creating it once."""
+    api_version = api_version or DEFAULT_AZURE_API_VERSION
+    key = (endpoint.rstrip("/"), deployment_name, api_version)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+            client = AsyncAzureOpenAI(
+                azure_endpoint=endpoint,
+                api_key=api_key,
+                api_version=api_version,
+                http_client=http_client,
+            )
+            _http_clients[key] = http_client
+            _clients[key] = client
+            logger.info(f"Created pooled Azure OpenAI client for {key[0]} / {deployment_name} (http2={HTTP2_AVAILABLE})")
+    return client
+
+
+def create_chat_completion(
+    endpoint: str,
+    deployment_name: str,
+    api_key: str | None = None,
+    api_version: str | None = None,
+    service_id: str | None = None,
+) -> AzureChatCompletion:
+    """AzureChatCompletion with its own service_id that sends requests over the shared pooled client."""
+    return AzureChatCompletion(
+        service_id=service_id,
+        endpoint=endpoint,
+        deployment_name=deployment_name,
+        api_key=api_key,
+        api_version=api_version or DEFAULT_AZURE_API_VERSION,
+        async_client=get_async_client(endpoint, deployment_name, api_key, api_version),
+    )
+
+
+async def warm_up() -> None:
+    """Open (TLS + keep-alive) a connection on every pooled client so the first agent call is not cold."""
+    async def _touch(endpoint: str, http_client: httpx.AsyncClient):
+        try:
+            # Any response, even 401/404, leaves a warm connection in the pool
+            await http_client.get(endpoint)
+        except httpx.HTTPError as ex:
+            logger.warning(f"Warm-up failed for {endpoint}: {ex}")
+
+    await asyncio.gather(*(_touch(key[0], c) for key, c in list(_http_clients.items())))
+
+
+async def close_all() -> None:
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        _http_clients.clear()
+    await asyncio.gather(*(c.close() for c in clients))
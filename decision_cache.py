@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class DecisionCache:
+    """LRU + TTL cache of routing/termination decisions, meant to be shared by every chat in a worker."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def discard(self, keys) -> int:
+        """Drop `keys` (e.g. the entries one chat wrote), leaving everyone else's; returns how many were held."""
+        return sum(self._entries.pop(key, None) is not None for key in keys)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return f"decision cache entries={len(self)} hits={self.hits} misses={self.misses} hit_rate={rate:.0%}"
+
+
+# Shared by every chat in this process unless a strategy is given its own cache
+shared_decision_cache = DecisionCache()
@@ -0,0 +1,104 @@
+import ast
+import hashlib
+import logging
+import sys
+from functools import lru_cache
+from importlib import metadata
+
+from decision_cache import DecisionCache
+
+logger = logging.getLogger(__name__)
+
+# Code that touches any of these can print something different on every run, so it is never cached
+NONDETERMINISTIC_MODULES = {
+    "time", "datetime", "calendar", "random", "secrets", "uuid",
+    "socket", "ssl", "http", "urllib", "urllib3", "requests", "httpx", "aiohttp", "websockets", "ftplib", "smtplib",
+    "subprocess", "multiprocessing", "threading", "asyncio", "psutil", "faker",
+}
+NONDETERMINISTIC_ATTRIBUTES = {"random", "urandom", "getpid", "environ", "getenv", "now", "today", "utcnow", "time"}
+NONDETERMINISTIC_CALLS = {"input", "id", "hash"}
+
+
+def normalize_code(code: str) -> str:
+    """Canonical source, so reformatting or comment-only changes still hit the cache."""
+    try:
+        return ast.unparse(ast.parse(code))
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in code.strip().splitlines())
+
+
+def _is_nondeterministic_module(name: str) -> bool:
+    # Any component counts: numpy.random is as random as random itself
+    return any(part in NONDETERMINISTIC_MODULES for part in name.split("."))
+
+
+def is_cacheable(code: str) -> bool:
+    """False when the code reads the clock, randomness, the environment or the network."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        # The SyntaxError itself is deterministic
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            if any(_is_nondeterministic_module(alias.name) for alias in node.names):
+                return False
+        elif isinstance(node, ast.ImportFrom):
+            if _is_nondeterministic_module(node.module or ""):
+                return False
+            # `from os import getenv` binds the attribute to a bare name the checks below never see
+            if any(alias.name in NONDETERMINISTIC_ATTRIBUTES | NONDETERMINISTIC_CALLS for alias in node.names):
+                return False
+        elif isinstance(node, ast.Attribute):
+            if node.attr in NONDETERMINISTIC_ATTRIBUTES:
+                return False
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id in NONDETERMINISTIC_CALLS or node.func.id == "__import__":
+                return False
+    return True
+
+
+@lru_cache(maxsize=1)
+def local_environment_fingerprint() -> str:
+    """Interpreter version plus installed distributions; a new package version invalidates old results."""
+    h = hashlib.sha256(sys.version.encode("utf-8"))
+    h.update(sys.executable.encode("utf-8"))
+    for name, version in sorted((d.metadata["Name"] or "", d.version) for d in metadata.distributions()):
+        h.update(f"\x1f{name}=={version}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class ExecutionCache:
+    """
+    Content-addressed cache of execution results, keyed by normalized code and an environment
+    fingerprint. Code that is not deterministic (see is_cacheable) is never stored or served.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600.0):
+        self._cache = DecisionCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    @staticmethod
+    def key(code: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\x1e{normalize_code(code)}".encode("utf-8")).hexdigest()
+
+    def get(self, code: str, fingerprint: str):
+        if not is_cacheable(code):
+            return None
+        result = self._cache.get(self.key(code, fingerprint))
+        if result is not None:
+            logger.info("Execution cache hit")
+        return result
+
+    def put(self, code: str, fingerprint: str, result) -> None:
+        if is_cacheable(code):
+            self._cache.put(self.key(code, fingerprint), result)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def summary(self) -> str:
+        return f"execution cache entries={len(self._cache)} hits={self._cache.hits} misses={self._cache.misses}"
+
+
+# Shared by every executor in this process
+shared_execution_cache = ExecutionCache()
@@ -0,0 +1,157 @@
+import contextvars
+import logging
+import time
+from dataclasses import dataclass, field
+
+from semantic_kernel.agents import Agent
+from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior, FunctionChoiceType
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.filters.auto_function_invocation.auto_function_invocation_context import AutoFunctionInvocationContext
+from semantic_kernel.filters.filter_types import FilterTypes
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.functions.kernel_function_decorator import kernel_function
+from semantic_kernel.functions.kernel_function_from_method import KernelFunctionFromMethod
+from semantic_kernel.functions.kernel_plugin import KernelPlugin
+
+logger = logging.getLogger(__name__)
+
+HANDOFF_PLUGIN_NAME = "Handoff"
+
+
+@dataclass
+class Hop:
+    from_agent: str
+    to_agent: str
+    reason: str
+    elapsed: float
+
+
+@dataclass
+class HandoffResult:
+    messages: list[ChatMessageContent]
+    trace: list[Hop] = field(default_factory=list)
+    hop_limit_reached: bool = False
+
+
+class _HandoffRequest:
+    def __init__(self):
+        self.target: str | None = None
+        self.reason = ""
+
+
+# The transfer functions run inside the agent's own completion; they report back through this
+_current_request: contextvars.ContextVar[_HandoffRequest | None] = contextvars.ContextVar("handoff_request", default=None)
+
+
+def _transfer_function(target: Agent) -> KernelFunctionFromMethod:
+    @kernel_function(
+        name=f"transfer_to_{target.name}",
+        description=f"Hand the conversation to {target.name}. {target.description or ''}".strip(),
+    )
+    def transfer(reason: str = "") -> str:
+        request = _current_request.get()
+        if request is not None:
+            request.target = target.name
+            request.reason = reason
+        return f"Transferred to {target.name}."
+
+    return KernelFunctionFromMethod(method=transfer, plugin_name=HANDOFF_PLUGIN_NAME)
+
+
+async def _stop_after_transfer(context: AutoFunctionInvocationContext, next):
+    # The transfer is the routing decision; skip the extra completion round trip after it
+    await next(context)
+    if context.function.plugin_name == HANDOFF_PLUGIN_NAME:
+        context.terminate = True
+
+
+def add_handoff_functions(agent: Agent, targets: list[Agent]) -> None:
+    """Register `transfer_to_<Agent>` functions for every other agent on `agent`'s kernel."""
+    functions = [_transfer_function(t) for t in targets if t.name != agent.name]
+    agent.kernel.add_plugin(KernelPlugin(name=HANDOFF_PLUGIN_NAME, functions=functions))
+    agent.kernel.add_filter(FilterTypes.AUTO_FUNCTION_INVOCATION, _stop_after_transfer)
+
+
+def _handoff_arguments(agent: Agent) -> KernelArguments:
+    """The agent's own execution settings with the Handoff plugin made callable."""
+    settings = {}
+    base = dict(agent.arguments.execution_settings) if agent.arguments and agent.arguments.execution_settings else {}
+    # Older ChatCompletionAgent versions keep a single `execution_settings` instead of arguments
+    legacy = getattr(agent, "execution_settings", None)
+    if legacy is not None:
+        base[legacy.service_id or agent.name] = legacy
+    for service_id, original in base.items():
+        copy = original.model_copy(deep=True)
+        behavior = copy.function_choice_behavior
+        if behavior is None or behavior.type_ == FunctionChoiceType.NONE:
+            copy.function_choice_behavior = FunctionChoiceBehavior.Auto(filters={"included_plugins": [HANDOFF_PLUGIN_NAME]})
+        elif behavior.filters and "included_plugins" in behavior.filters:
+            filters = dict(behavior.filters)
+            filters["included_plugins"] = [*filters["included_plugins"], HANDOFF_PLUGIN_NAME]
+            behavior.filters = filters
+        settings[service_id] = copy
+    return KernelArguments(settings=settings) if settings else KernelArguments()
+
+
+def _assistant_text(produced: list[ChatMessageContent]) -> str:
+    """The last thing the agent said itself, skipping function results."""
+    for message in reversed(produced):
+        if message.role == AuthorRole.ASSISTANT and message.content:
+            return str(message.content)
+    return ""
+
+
+class HandoffOrchestration:
+    """
+    Lets agents route by calling `transfer_to_<Agent>` inside their own completion instead of asking
+    a central selector. The run ends when an agent answers without transferring or after `max_hops`.
+    """
+
+    def __init__(self, agents: list[Agent], max_hops: int = 5):
+        self.agents = {a.name: a for a in agents}
+        self.max_hops = max_hops
+        self._arguments = {}
+        for agent in agents:
+            add_handoff_functions(agent, agents)
+            self._arguments[agent.name] = _handoff_arguments(agent)
+
+    async def invoke(self, request: str, initial_agent: str) -> HandoffResult:
+        messages = [ChatMessageContent(role=AuthorRole.USER, content=request)]
+        result = HandoffResult(messages=messages)
+        current = initial_agent
+
+        while True:
+            handoff = _HandoffRequest()
+            token = _current_request.set(handoff)
+            started = time.perf_counter()
+            # A transfer ends the completion on the function result, so the text the agent wrote
+            # alongside the call (e.g. the code it hands over) only arrives as an intermediate message
+            produced: list[ChatMessageContent] = []
+
+            async def collect(message: ChatMessageContent) -> None:
+                produced.append(message)
+
+            try:
+                async for response in self.agents[current].invoke(
+                    messages=list(messages), arguments=self._arguments[current], on_intermediate_message=collect
+                ):
+                    produced.append(response.message)
+            finally:
+                _current_request.reset(token)
+
+            content = _assistant_text(produced)
+            if content:
+                messages.append(ChatMessageContent(role=AuthorRole.ASSISTANT, name=current, content=content))
+
+            if handoff.target is None:
+                return result
+
+            hop = Hop(current, handoff.target, handoff.reason, time.perf_counter() - started)
+            result.trace.append(hop)
+            logger.info(f"Handoff {len(result.trace)}: {hop.from_agent} -> {hop.to_agent} ({hop.reason})")
+            if len(result.trace) >= self.max_hops:
+                logger.warning(f"Handoff hop limit ({self.max_hops}) reached at {hop.to_agent}")
+                result.hop_limit_reached = True
+                return result
+            current = handoff.target
@@ -0,0 +1,231 @@
+import ast
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Frames (pygame display updates / tkinter event-loop ticks) a GUI program may run before it is stopped
+HEADLESS_FRAME_BUDGET = int(os.getenv("HEADLESS_FRAME_BUDGET", "120"))
+VIRTUAL_DISPLAY = os.getenv("HEADLESS_DISPLAY", ":99")
+
+# Top-level import name -> framework handled by the prelude
+GUI_MODULES = {
+    "pygame": "pygame",
+    "tkinter": "tkinter",
+    "Tkinter": "tkinter",
+    "turtle": "tkinter",
+    "customtkinter": "tkinter",
+    "matplotlib": "matplotlib",
+    "pylab": "matplotlib",
+}
+# Frameworks that need an X display even when rendering headless
+DISPLAY_FRAMEWORKS = {"tkinter"}
+
+SKIPPED_PREFIX = "[headless] SKIPPED: "
+
+# Runs before the generated code. Every GUI program ends with one "[headless] PASS/FAIL/SKIPPED" line.
+# Safe to run again in the same interpreter (a reused session): the originals it wraps are kept once,
+# on the "_headless" module and pygame.display._headless_orig, and every run starts a fresh budget and verdict.
+PRELUDE_TEMPLATE = r'''
+import atexit, linecache, os, sys, time, types
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("MPLBACKEND", "Agg")
+if "matplotlib" in sys.modules:
+    # Already imported (e.g. pre-imported by a pooled worker), so MPLBACKEND is read too late
+    sys.modules["matplotlib"].use("Agg")
+if %(display)r and not os.environ.get("DISPLAY"):
+    os.environ["DISPLAY"] = %(display)r
+
+_h = sys.modules.get("_headless")
+if _h is None:
+    _h = sys.modules["_headless"] = types.ModuleType("_headless")
+    _h.exit, _h.excepthook = sys.exit, sys.excepthook
+    # A single-use worker reports when the process ends; a persistent kernel reports from run()
+    atexit.register(lambda: sys.modules["_headless"].report())
+_h.budget = %(budget)d
+_h.frames = 0
+# Exit code / uncaught exception of the program, so a crash is not reported as PASS
+_h.failure = None
+_h.reported = False
+
+def _headless_record_exit(code=0):
+    if code not in (None, 0):
+        _h.failure = f"exited with code {code}"
+    _h.exit(code)
+
+def _headless_record_exception(kind, value, tb):
+    _h.failure = f"raised {kind.__name__}"
+    _h.excepthook(kind, value, tb)
+
+def _headless_report():
+    if _h.reported:
+        return
+    _h.reported = True
+    if _h.failure is not None:
+        print(f"[headless] FAIL: program {_h.failure} after {_h.frames} frames", flush=True)
+    elif 0 < _h.frames < _h.budget:
+        print(f"[headless] PASS: program exited after {_h.frames} frames", flush=True)
+
+def _headless_frame(kind):
+    _h.frames += 1
+    if _h.frames >= _h.budget:
+        _h.reported = True
+        print(f"[headless] PASS: {kind} ran {_h.frames} frames without error", flush=True)
+        raise SystemExit(0)
+
+def _headless_run(code, namespace, filename="<generated>"):
+    # For interpreters that outlive the program: the verdict is printed when the code returns, not at exit
+    linecache.cache[filename] = (len(code), None, code.splitlines(True), filename)
+    try:
+        exec(compile(code, filename, "exec"), namespace)
+    except SystemExit as ex:
+        if ex.code not in (None, 0):
+            _h.failure = f"exited with code {ex.code}"
+        raise
+    except BaseException as ex:
+        _h.failure = f"raised {type(ex).__name__}"
+        raise
+    finally:
+        _h.report()
+
+_h.report, _h.frame, _h.run = _headless_report, _headless_frame, _headless_run
+sys.exit = _headless_record_exit
+sys.excepthook = _headless_record_exception
+
+if "pygame" in %(frameworks)r:
+    try:
+        import pygame
+    except ImportError:
+        pygame = None
+    if pygame is not None:
+        if not hasattr(pygame.display, "_headless_orig"):
+            pygame.display._headless_orig = {
+                "flip": pygame.display.flip, "update": pygame.display.update, "Clock": pygame.time.Clock,
+                "delay": pygame.time.delay, "wait": pygame.time.wait,
+            }
+        _orig = pygame.display._headless_orig
+        def _counted(real):
+            def wrapper(*args, **kwargs):
+                result = real(*args, **kwargs)
+                _h.frame("pygame")
+                return result
+            return wrapper
+        pygame.display.flip = _counted(_orig["flip"])
+        pygame.display.update = _counted(_orig["update"])
+        _RealClock = _orig["Clock"]
+        class _HeadlessClock:
+            # Frame-rate caps would only make the budget take longer; tick without sleeping
+            def __init__(self):
+                self._clock = _RealClock()
+            def tick(self, framerate=0):
+                return self._clock.tick()
+            tick_busy_loop = tick
+            def __getattr__(self, name):
+                return getattr(self._clock, name)
+        pygame.time.Clock = _HeadlessClock
+        pygame.time.delay = pygame.time.wait = lambda milliseconds: 0
+
+if "tkinter" in %(frameworks)r:
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        _h.reported = True
+        print("[headless] SKIPPED: no display available for tkinter", flush=True)
+        raise SystemExit(0)
+    import tkinter
+    def _headless_mainloop(self=None, n=0):
+        root = self if isinstance(self, tkinter.Misc) else tkinter._default_root
+        while root is not None:
+            root.update()
+            _h.frame("tkinter")
+            time.sleep(1 / 120)
+    tkinter.Misc.mainloop = _headless_mainloop
+    tkinter.mainloop = _headless_mainloop
+'''
+
+
+def headless_skip_reason(output: str) -> str | None:
+    """Why a GUI program was not run at all, from its "[headless] SKIPPED" line; None if it ran."""
+    for line in output.splitlines():
+        if line.startswith(SKIPPED_PREFIX):
+            return line[len(SKIPPED_PREFIX):].strip()
+    return None
+
+
+def detect_gui(code: str) -> set[str]:
+    """GUI frameworks the code imports (see GUI_MODULES)."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    frameworks = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [a.name for a in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = [node.module or ""]
+        else:
+            continue
+        for name in names:
+            framework = GUI_MODULES.get(name.split(".")[0])
+            if framework:
+                frameworks.add(framework)
+    return frameworks
+
+
+_display: subprocess.Popen | None = None
+_display_lock = threading.Lock()
+
+
+def ensure_virtual_display() -> str | None:
+    """The X display to render on: $DISPLAY, or a shared Xvfb started on first use; None when neither exists."""
+    global _display
+    if os.environ.get("DISPLAY"):
+        return os.environ["DISPLAY"]
+    with _display_lock:
+        if _display is not None and _display.poll() is None:
+            return VIRTUAL_DISPLAY
+        xvfb = shutil.which("Xvfb")
+        if xvfb is None:
+            return None
+        _display = subprocess.Popen(
+            [xvfb, VIRTUAL_DISPLAY, "-screen", "0", "1024x768x24", "-nolisten", "tcp"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        # Tk fails to connect until the server socket exists
+        socket_path = f"/tmp/.X11-unix/X{VIRTUAL_DISPLAY.lstrip(':').split('.')[0]}"
+        deadline = time.monotonic() + 2
+        while not os.path.exists(socket_path) and time.monotonic() < deadline and _display.poll() is None:
+            time.sleep(0.02)
+        logger.info(f"Started Xvfb on {VIRTUAL_DISPLAY} for headless GUI runs")
+        return VIRTUAL_DISPLAY
+
+
+def headless_prelude(code: str, frame_budget: int = HEADLESS_FRAME_BUDGET, display: str | None = None) -> str | None:
+    """Source to run before `code` so its GUI runs headless for `frame_budget` frames; None for non-GUI code."""
+    frameworks = detect_gui(code)
+    if not frameworks:
+        return None
+    if frameworks & DISPLAY_FRAMEWORKS and display is None:
+        display = ensure_virtual_display()
+    return PRELUDE_TEMPLATE % {"display": display or "", "budget": frame_budget, "frameworks": sorted(frameworks)}
+
+
+def with_headless_prelude(code: str, frame_budget: int = HEADLESS_FRAME_BUDGET) -> str:
+    """
+    `code` wrapped for a persistent interpreter (a session kernel): the prelude runs, then `code`
+    runs in the session's globals and the verdict is printed as soon as it finishes.
+    """
+    # Remote sandboxes have no Xvfb we control; tkinter there relies on the sandbox's own DISPLAY
+    frameworks = detect_gui(code)
+    if not frameworks:
+        return code
+    prelude = PRELUDE_TEMPLATE % {"display": "", "budget": frame_budget, "frameworks": sorted(frameworks)}
+    return (
+        f"exec(compile({prelude!r}, '<headless>', 'exec'), {{'__name__': '__headless__'}})\n"
+        f"__import__('sys').modules['_headless'].run({code!r}, globals())"
+    )
@@ -0,0 +1,241 @@
+import json
+import logging
+import math
+import os
+import random
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+
+from pydantic import Field
+
+from semantic_kernel.agents import Agent
+from semantic_kernel.agents.strategies.selection.selection_strategy import SelectionStrategy
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.exceptions.agent_exceptions import AgentExecutionException
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = {
+    "a", "an", "and", "any", "be", "can", "for", "i", "in", "is", "it", "me", "my", "of",
+    "on", "or", "please", "that", "the", "then", "this", "to", "with", "you",
+}
+# Bigrams are more specific than single keywords ("azure function" vs "function")
+BIGRAM_WEIGHT = 2.0
+# Winning score needed for full confidence: one matched bigram or two agent-specific keywords.
+# A lone keyword wins every vote it takes part in, which says little about the intent.
+MIN_EVIDENCE_SCORE = 3.0
+# Fraction of confident decisions still sent to the LLM; without it the disagreement rate only
+# covers the low-confidence messages and says nothing about the routes taken locally
+ROUTER_SHADOW_RATE = float(os.getenv("ROUTER_SHADOW_RATE", "0.05"))
+# Matches the example lines in selector_prompt.txt: - "Run this and show output..." → {CODEEXECUTOR_NAME}
+PROMPT_EXAMPLE_PATTERN = re.compile(r"[\"“](.+?)[\"”]\s*(?:→|->)\s*\{(\w+)\}")
+# ...and the agent descriptions: - {CODEWRITER_NAME}: For writing, generating, or modifying code...
+PROMPT_DESCRIPTION_PATTERN = re.compile(r"^\s*-\s*\{(\w+)\}:\s*(.+)$", re.MULTILINE)
+
+
+def ngrams(text: str) -> list[str]:
+    tokens = [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def load_prompt_examples(path: str, placeholders: dict[str, str]) -> list[tuple[str, str]]:
+    """Read phrase → agent examples and agent descriptions from a selector prompt,
+    mapping {PLACEHOLDER} names to agent names."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    examples = []
+    for phrase, placeholder in PROMPT_EXAMPLE_PATTERN.findall(text):
+        if placeholder in placeholders:
+            examples.append((phrase.rstrip(". "), placeholders[placeholder]))
+    for placeholder, description in PROMPT_DESCRIPTION_PATTERN.findall(text):
+        if placeholder in placeholders:
+            examples.append((description, placeholders[placeholder]))
+    return examples
+
+
+def load_logged_decisions(path: str) -> list[tuple[str, str]]:
+    """Read past routing decisions written by log_decision()."""
+    if not os.path.exists(path):
+        return []
+    examples = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+                examples[(entry["message"], entry["agent"])] = None
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return list(examples)
+
+
+def log_decision(path: str, message: str, agent: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"message": message, "agent": agent}) + "\n")
+
+
+@dataclass
+class RouterStats:
+    lookups: int = 0
+    local_hits: int = 0
+    llm_calls: int = 0
+    # Fallback answers served from a decision cache rather than a new LLM call
+    cached_fallbacks: int = 0
+    compared: int = 0
+    disagreements: int = 0
+    # Confident decisions re-checked by the LLM: how often the routes taken locally are wrong
+    shadowed: int = 0
+    shadow_disagreements: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.local_hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def disagreement_rate(self) -> float:
+        return self.disagreements / self.compared if self.compared else 0.0
+
+    @property
+    def local_error_rate(self) -> float:
+        return self.shadow_disagreements / self.shadowed if self.shadowed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"router lookups={self.lookups} hit_rate={self.hit_rate:.0%} llm_calls={self.llm_calls} "
+            f"cached_fallbacks={self.cached_fallbacks} "
+            f"disagreement_rate={self.disagreement_rate:.0%} ({self.disagreements}/{self.compared}) "
+            f"local_error_rate={self.local_error_rate:.0%} ({self.shadow_disagreements}/{self.shadowed})"
+        )
+
+
+class IntentRouter:
+    """
+    Weighted keyword/n-gram intent classifier.
+    Each n-gram votes for the agents it was seen with, weighted by how specific it is (idf),
+    and the confidence is the winning agent's share of the total vote, scaled down while the
+    winning score is below `min_score` (too little evidence to trust the vote).
+    """
+
+    def __init__(self, examples: list[tuple[str, str]] | None = None, min_score: float = MIN_EVIDENCE_SCORE):
+        self.min_score = min_score
+        self._counts: dict[str, dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._agents: set[str] = set()
+        self._examples: set[tuple[str, str]] = set()
+        self._weights: dict[str, dict[str, float]] = {}
+        for text, agent in examples or []:
+            self.add_example(text, agent, rebuild=False)
+        self._rebuild()
+
+    def add_example(self, text: str, agent: str, rebuild: bool = True) -> bool:
+        """Learn `text` → `agent`; returns False (and changes nothing) for an example already known."""
+        key = (" ".join(ngrams(text)), agent)
+        if key in self._examples:
+            return False
+        self._examples.add(key)
+        self._agents.add(agent)
+        for gram in set(ngrams(text)):
+            self._counts[gram][agent] += 1
+        if rebuild:
+            self._rebuild()
+        return True
+
+    def _rebuild(self) -> None:
+        n_agents = max(len(self._agents), 1)
+        weights = {}
+        for gram, per_agent in self._counts.items():
+            total = sum(per_agent.values())
+            idf = math.log(1 + n_agents / len(per_agent))
+            scale = BIGRAM_WEIGHT if " " in gram else 1.0
+            weights[gram] = {agent: scale * idf * count / total for agent, count in per_agent.items()}
+        self._weights = weights
+
+    def classify(self, text: str) -> tuple[str | None, float]:
+        """Return (agent name, confidence in [0, 1]); (None, 0.0) when nothing matches."""
+        scores: dict[str, float] = defaultdict(float)
+        for gram in ngrams(text):
+            for agent, weight in self._weights.get(gram, {}).items():
+                scores[agent] += weight
+        if not scores:
+            return None, 0.0
+        best = max(scores, key=scores.get)
+        share = scores[best] / sum(scores.values())
+        evidence = min(1.0, scores[best] / self.min_score) if self.min_score > 0 else 1.0
+        return best, share * evidence
+
+
+class IntentRouterSelectionStrategy(SelectionStrategy):
+    """
+    Route on the user's latest message with a local IntentRouter and only call the fallback
+    (LLM) selector when the router's confidence is below `threshold`.
+    LLM decisions are compared against the local guess for the disagreement rate, learned,
+    and optionally appended to `log_path` so the next process starts with them.
+    """
+
+    router: IntentRouter
+    fallback: SelectionStrategy
+    threshold: float = 0.6
+    # Fraction of confident decisions that are still sent to the LLM to measure disagreement
+    shadow_rate: float = ROUTER_SHADOW_RATE
+    log_path: str | None = None
+    stats: RouterStats = Field(default_factory=RouterStats)
+
+    async def select_agent(self, agents: list[Agent], history: list[ChatMessageContent]) -> Agent:
+        if history and history[-1].role != AuthorRole.USER:
+            # Mid-turn selections depend on agent output, not intent
+            return await self.fallback.select_agent(agents, history)
+        message = history[-1].content if history else ""
+
+        self.stats.lookups += 1
+        guess, confidence = self.router.classify(message)
+        local = next((a for a in agents if a.name == guess), None)
+        shadow = local is not None and confidence >= self.threshold and random.random() < self.shadow_rate
+
+        if local is not None and confidence >= self.threshold and not shadow:
+            self.stats.local_hits += 1
+            logger.debug(f"Intent router picked {guess} ({confidence:.2f})")
+            return local
+
+        cache = getattr(self.fallback, "cache", None)
+        hits = cache.hits if cache is not None else 0
+        selected = await self.fallback.select_agent(agents, history)
+        if cache is not None and cache.hits > hits:
+            self.stats.cached_fallbacks += 1
+        else:
+            self.stats.llm_calls += 1
+        if guess is not None:
+            self.stats.compared += 1
+            if shadow:
+                self.stats.shadowed += 1
+            if guess != selected.name:
+                self.stats.disagreements += 1
+                if shadow:
+                    self.stats.shadow_disagreements += 1
+                logger.info(f"Intent router disagreed: local={guess} ({confidence:.2f}) llm={selected.name}")
+
+        # Repeated messages (e.g. answered from the cache) are already learned and logged
+        if self.router.add_example(message, selected.name) and self.log_path:
+            log_decision(self.log_path, message, selected.name)
+        return selected
+
+
+class RouterGuessSelectionStrategy(SelectionStrategy):
+    """
+    Last-resort selector for when the LLM's choice is unusable: the IntentRouter's best guess on a
+    user turn (whatever its confidence), otherwise the `fallback` strategy (e.g. a transition table).
+    """
+
+    router: IntentRouter
+    fallback: SelectionStrategy | None = None
+
+    async def select_agent(self, agents: list[Agent], history: list[ChatMessageContent]) -> Agent:
+        if not history or history[-1].role == AuthorRole.USER:
+            guess, confidence = self.router.classify(history[-1].content if history else "")
+            agent = next((a for a in agents if a.name == guess), None)
+            if agent is not None:
+                logger.info(f"Falling back to the intent router's guess {guess} ({confidence:.2f})")
+                return agent
+        if self.fallback is None:
+            raise AgentExecutionException("Intent router has no guess and there is no fallback selector")
+        return await self.fallback.select_agent(agents, history)
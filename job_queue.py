@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+# The app directory is read-only when Functions run from a package
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "multiagent_jobs.sqlite3"))
+# Runs executing at once per worker; further jobs wait in the queue
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+# Finished jobs are kept this long for polling, then pruned
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+# Progress events kept per job (oldest dropped first)
+JOB_MAX_EVENTS = int(os.getenv("JOB_MAX_EVENTS", "50"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+# Runs one job: receives the request and a progress callback, returns the JSON-serializable result
+JobRunner = Callable[[dict, Callable[[dict], None]], Awaitable[Any]]
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    request: dict
+    status: str = QUEUED
+    created: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    events: list = field(default_factory=list)
+    partial: dict = field(default_factory=dict)
+    result: Any = None
+    error: str | None = None
+    # Process running the job, so a restarted worker can tell its own orphaned jobs from live ones
+    owner: int | None = None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class InMemoryJobStore:
+    """Jobs in a dict; visible only to this worker process and lost on restart."""
+
+    def __init__(self):
+        self._jobs: dict[str, Job] = {}
+
+    async def save(self, job: Job) -> None:
+        self._jobs[job.id] = job
+
+    async def load(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    async def prune(self, finished_before: float) -> int:
+        expired = [j.id for j in self._jobs.values() if j.status in FINISHED and j.finished < finished_before]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
+
+
+class SqliteJobStore:
+    """Jobs as JSON rows in a SQLite file, so job state survives restarts and is shared by workers on one host."""
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, finished REAL, data TEXT NOT NULL)"
+        )
+        self._fail_orphans()
+
+    def _fail_orphans(self) -> None:
+        """Mark jobs whose worker process is gone as failed; nothing will ever finish them."""
+        rows = self._execute("SELECT data FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING))
+        for (data,) in rows:
+            job = Job(**json.loads(data))
+            if _process_alive(job.owner) and job.owner != os.getpid():
+                continue
+            left = job.status
+            job.status, job.error, job.finished = FAILED, "Worker restarted before the job finished", time.time()
+            self._execute(
+                "UPDATE jobs SET status = ?, finished = ?, data = ? WHERE id = ?",
+                (job.status, job.finished, json.dumps(job.to_dict(), default=str), job.id),
+            )
+            logger.warning(f"Job {job.id} was left {left} by a stopped worker; marked failed")
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _delete(self, sql: str, params: tuple = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    async def save(self, job: Job) -> None:
+        data = json.dumps(job.to_dict(), default=str)
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT OR REPLACE INTO jobs (id, status, finished, data) VALUES (?, ?, ?, ?)",
+            (job.id, job.status, job.finished, data),
+        )
+
+    async def load(self, job_id: str) -> Job | None:
+        rows = await asyncio.to_thread(self._execute, "SELECT data FROM jobs WHERE id = ?", (job_id,))
+        return Job(**json.loads(rows[0][0])) if rows else None
+
+    async def prune(self, finished_before: float) -> int:
+        return await asyncio.to_thread(
+            self._delete, "DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (finished_before,)
+        )
+
+
+def _process_alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+JOB_STORES = {
+    "memory": InMemoryJobStore,
+    "sqlite": SqliteJobStore,
+}
+
+
+def create_job_store(name: str | None = None):
+    name = (name or JOB_STORE).lower()
+    if name not in JOB_STORES:
+        raise ValueError(f"Unknown job store '{name}', expected one of {list(JOB_STORES)}")
+    return JOB_STORES[name]()
+
+
+class JobScheduler:
+    """
+    Runs submitted jobs in the background, at most `max_concurrency` at a time, and records their
+    status, progress events and partial results in `store` for polling. Submissions beyond
+    `max_queued` waiting jobs are rejected with JobQueueFull.
+    """
+
+    def __init__(
+        self,
+        runner: JobRunner,
+        store=None,
+        max_concurrency: int = JOB_MAX_CONCURRENCY,
+        max_queued: int = JOB_MAX_QUEUED,
+        ttl_seconds: float = JOB_TTL_SECONDS,
+    ):
+        self.runner = runner
+        self.store = store or create_job_store()
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._saving: dict[str, asyncio.Task] = {}
+        self._dirty: set[str] = set()
+        self._queued = 0
+
+    async def submit(self, request: dict) -> Job:
+        if self._queued >= self.max_queued:
+            raise JobQueueFull(f"{self._queued} jobs already queued")
+        job = Job(id=uuid.uuid4().hex, request=request, owner=os.getpid())
+        self._queued += 1
+        try:
+            await self.store.save(job)
+        except BaseException:
+            self._queued -= 1
+            raise
+        task = asyncio.create_task(self._run(job))
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job
+
+    async def get(self, job_id: str) -> Job | None:
+        return await self.store.load(job_id)
+
+    async def cancel(self, job_id: str) -> Job | None:
+        """Cancel a queued or running job of this worker; finished jobs are returned unchanged."""
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            # Let the job record its cancellation before reporting it
+            await asyncio.wait([task])
+        return await self.store.load(job_id)
+
+    async def _run(self, job: Job) -> None:
+        try:
+            async with self._slots:
+                self._queued -= 1
+                job.status, job.started = RUNNING, time.time()
+                await self.store.save(job)
+                job.result = await self.runner(job.request, lambda event: self._record(job, event))
+                job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            if job.status == QUEUED:
+                self._queued -= 1
+            job.status = CANCELLED
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished = time.time()
+            # A progress save still in flight must not land after (and overwrite) the final state
+            saving = self._saving.get(job.id)
+            if saving is not None:
+                await asyncio.wait([saving])
+            await asyncio.shield(self.store.save(job))
+            await self.store.prune(job.finished - self.ttl_seconds)
+
+    def _record(self, job: Job, event: dict) -> None:
+        # Token deltas are too fine-grained to persist; the complete turn arrives as a message event
+        if event.get("event") == "delta":
+            return
+        job.events.append({"time": time.time(), **event})
+        del job.events[:-JOB_MAX_EVENTS]
+        # Latest event of each type, e.g. partial["execution_result"] while the executor is still talking
+        job.partial[event.get("event", "progress")] = {k: v for k, v in event.items() if k != "event"}
+        self._schedule_save(job)
+
+    def _schedule_save(self, job: Job) -> None:
+        # One save per job at a time; events arriving meanwhile are written by the same save loop
+        saving = self._saving.get(job.id)
+        if saving is not None and not saving.done():
+            self._dirty.add(job.id)
+            return
+        task = asyncio.create_task(self._save_progress(job))
+        self._saving[job.id] = task
+        task.add_done_callback(lambda _: self._saving.pop(job.id, None))
+
+    async def _save_progress(self, job: Job) -> None:
+        try:
+            while True:
+                self._dirty.discard(job.id)
+                await self.store.save(job)
+                if job.id not in self._dirty:
+                    return
+        except Exception:
+            logger.exception(f"Saving progress of job {job.id} failed")
+
+    def summary(self) -> str:
+        return f"jobs running={len(self._tasks) - self._queued} queued={self._queued}"
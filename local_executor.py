@@ -0,0 +1,424 @@
+import ast
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from execution_cache import local_environment_fingerprint, shared_execution_cache
+from headless import detect_gui, headless_prelude
+from output_capture import SegmentedCapture
+from venv_cache import get_venv_cache, required_distributions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 20
+DEFAULT_POOL_SIZE = int(os.getenv("CODE_RUNNER_POOL_SIZE", "2"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("CODE_RUNNER_MAX_CONCURRENCY", "4"))
+# Run code that imports packages the base interpreter lacks in a cached venv (see venv_cache.py).
+# Off by default: installs need a WHEELHOUSE_DIR or a VENV_ALLOWED_DISTRIBUTIONS allowlist.
+RESOLVE_DEPENDENCIES = os.getenv("CODE_RUNNER_RESOLVE_DEPENDENCIES", "0") == "1"
+VENV_SPARE_WORKERS = 1
+# Spare venv workers are reaped once their venv is evicted, unused this long, or beyond the most recent few venvs
+VENV_WORKER_IDLE_SECONDS = float(os.getenv("CODE_RUNNER_VENV_IDLE_SECONDS", "600"))
+VENV_MAX_WARM = int(os.getenv("CODE_RUNNER_VENV_MAX_WARM", "4"))
+# Imported once by every pooled interpreter before it is handed any code; missing modules are skipped
+DEFAULT_PREIMPORTS = tuple(m for m in os.getenv("CODE_RUNNER_PREIMPORTS", "numpy,pandas,matplotlib").split(",") if m)
+
+# Written to stdout and stderr before each block so a multi-block run can be split per block
+BLOCK_MARKER = "\x00__block__\x00\n"
+
+# Runs inside each pooled interpreter: pre-import, then block on stdin for exactly one program,
+# sent as JSON {"prelude": source or null, "blocks": [...]}. The prelude (e.g. headless GUI setup)
+# runs first in its own namespace; the blocks run in order in one __main__ namespace (notebook style).
+# A worker is single-use, so every program gets a fresh process and a clean namespace.
+WORKER_SOURCE = r"""
+import json, linecache, sys, traceback
+for _name in sys.argv[1:]:
+    try:
+        __import__(_name)
+    except Exception:
+        pass
+_payload = json.loads(sys.stdin.read())
+sys.stdin.close()
+_blocks = _payload["blocks"]
+if _payload.get("prelude"):
+    exec(compile(_payload["prelude"], "<headless>", "exec"), {"__name__": "__headless__"})
+sys.argv = ["<generated>"]
+_main = type(sys)("__main__")
+sys.modules["__main__"] = _main
+for _i, _code in enumerate(_blocks):
+    _file = "<generated>" if len(_blocks) == 1 else f"<block {_i + 1}>"
+    linecache.cache[_file] = (len(_code), None, _code.splitlines(True), _file)
+    if len(_blocks) > 1:
+        for _stream in (sys.stdout, sys.stderr):
+            _stream.write(%r)
+            _stream.flush()
+    try:
+        exec(compile(_code, _file, "exec"), _main.__dict__)
+    except SystemExit as _ex:
+        # Through sys.exit, so the headless prelude sees the exit code
+        sys.exit(_ex.code)
+    except BaseException as _ex:
+        traceback.print_exception(type(_ex), _ex, _ex.__traceback__.tb_next)
+        sys.exit(1)
+""" % BLOCK_MARKER
+
+READ_CHUNK_BYTES = 4096
+
+# on_output(stream, text) with stream "stdout" or "stderr"
+OutputCallback = Callable[[str, str], None]
+
+BLOCK_MODES = ("auto", "sequential", "concurrent", "concatenate")
+
+
+def _defined_names(tree: ast.AST) -> set[str]:
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.add(node.id)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((a.asname or a.name).split(".")[0] for a in node.names)
+    return names
+
+
+def blocks_share_state(blocks: list[str]) -> bool:
+    """True when a block uses a name defined by an earlier block (e.g. a helper block and a main block)."""
+    defined: set[str] = set()
+    for code in blocks:
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return True
+        used = {n.id for n in ast.walk(tree) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Load)}
+        if used & defined:
+            return True
+        defined |= _defined_names(tree)
+    return False
+
+
+@dataclass
+class _Run:
+    """Raw outcome of one worker: captured output per segment (one per block after the first)."""
+    stdout: list[str]
+    stderr: list[str]
+    exit_code: int | None
+    timed_out: bool
+    duration: float
+
+
+@dataclass
+class ExecutionResult:
+    stdout: str
+    stderr: str
+    exit_code: int | None
+    timed_out: bool = False
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.exit_code == 0 and not self.timed_out
+
+    @property
+    def skipped(self) -> bool:
+        """Never ran: the program ended (or was stopped) before this block started."""
+        return self.exit_code is None and not self.timed_out
+
+
+class InterpreterPool:
+    """
+    Keeps `size` Python interpreters started (with `preimports` loaded) and waiting for code on stdin.
+    A run takes an idle worker and immediately starts its replacement, so interpreter startup and
+    imports are paid in the background instead of on each run. At most `max_concurrency` programs
+    run at once. Each worker leads its own process group, which is killed on timeout or cancellation
+    so processes started by the generated code go with it. Code that imports packages the base
+    interpreter lacks runs on a cached venv that has them (see venv_cache.VenvCache).
+    """
+
+    def __init__(
+        self,
+        size: int = DEFAULT_POOL_SIZE,
+        preimports: tuple[str, ...] = DEFAULT_PREIMPORTS,
+        python: str = sys.executable,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        resolve_dependencies: bool = RESOLVE_DEPENDENCIES,
+    ):
+        self.size = size
+        self.resolve_dependencies = resolve_dependencies
+        self.preimports = preimports
+        self.python = python
+        # Idle workers per interpreter: the base python, plus any cached venvs for generated code's dependencies
+        self._idle: dict[str, list[asyncio.subprocess.Process]] = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._replenishing: dict[str, asyncio.Task] = {}
+        self._last_used: dict[str, float] = {}
+        self._reap_timer: asyncio.TimerHandle | None = None
+        self._reaping: asyncio.Task | None = None
+
+    async def _spawn(self, python: str) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            python, "-c", WORKER_SOURCE, *self.preimports,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=os.name == "posix",
+        )
+
+    async def warm(self, python: str | None = None) -> None:
+        python = python or self.python
+        idle = self._idle.setdefault(python, [])
+        # Venv workers are only kept warm for the fix-and-rerun loop of the code that needed them
+        size = self.size if python == self.python else VENV_SPARE_WORKERS
+        while len(idle) < size:
+            idle.append(await self._spawn(python))
+
+    async def _take(self, python: str) -> asyncio.subprocess.Process:
+        self._last_used[python] = time.monotonic()
+        await self._reap_venv_workers()
+        if python != self.python:
+            # Reap this venv's spare later even if no other run comes along to do it
+            if self._reap_timer is not None:
+                self._reap_timer.cancel()
+            self._reap_timer = asyncio.get_running_loop().call_later(VENV_WORKER_IDLE_SECONDS + 1, self._start_reap)
+        idle = self._idle.setdefault(python, [])
+        while idle:
+            worker = idle.pop(0)
+            if worker.returncode is None:
+                break
+        else:
+            worker = await self._spawn(python)
+        task = self._replenishing.get(python)
+        if task is None or task.done():
+            self._replenishing[python] = asyncio.create_task(self.warm(python))
+        return worker
+
+    @contextlib.asynccontextmanager
+    async def _interpreter(self, distributions: tuple[str, ...]):
+        """
+        The base python, or a cached venv's python when the code imports packages the base lacks;
+        the venv cannot be evicted until the block exits.
+        """
+        python = self.python
+        if distributions:
+            try:
+                python = await get_venv_cache().ensure(distributions)
+            except Exception as ex:
+                # Fall back to the base interpreter; the code then fails with a plain ModuleNotFoundError
+                logger.warning(f"Could not prepare a venv for {', '.join(distributions)}: {ex}")
+        if python == self.python:
+            yield python
+            return
+        try:
+            yield python
+        finally:
+            get_venv_cache().release(distributions)
+
+    def _start_reap(self) -> None:
+        self._reap_timer = None
+        self._reaping = asyncio.create_task(self._reap_venv_workers())
+
+    async def _reap_venv_workers(self) -> None:
+        """Kill spare workers of venvs that were evicted, went unused, or fell out of the VENV_MAX_WARM most recent."""
+        venvs = sorted((p for p in self._idle if p != self.python), key=lambda p: self._last_used.get(p, 0), reverse=True)
+        now = time.monotonic()
+        for rank, python in enumerate(venvs):
+            if rank < VENV_MAX_WARM and os.path.exists(python) and now - self._last_used.get(python, 0) < VENV_WORKER_IDLE_SECONDS:
+                continue
+            task = self._replenishing.pop(python, None)
+            if task is not None:
+                task.cancel()
+            self._last_used.pop(python, None)
+            for worker in self._idle.pop(python):
+                self._kill(worker)
+                await worker.wait()
+            logger.info(f"Reaped spare workers of {python}")
+
+    @staticmethod
+    def _kill(worker: asyncio.subprocess.Process) -> None:
+        if worker.returncode is not None:
+            return
+        try:
+            if os.name == "posix":
+                os.killpg(worker.pid, signal.SIGKILL)
+            else:
+                worker.kill()
+        except ProcessLookupError:
+            pass
+
+    async def run(
+        self, code: str, timeout: float = DEFAULT_TIMEOUT, use_cache: bool = True, on_output: OutputCallback | None = None
+    ) -> ExecutionResult:
+        """
+        Run `code` in a pooled interpreter; byte-identical deterministic code is served from the execution cache.
+        `on_output(stream, text)` receives stdout/stderr as it is produced.
+        """
+        distributions = required_distributions(code) if self.resolve_dependencies else ()
+        fingerprint = local_environment_fingerprint() + "".join(f"+{d}" for d in distributions)
+        if use_cache:
+            cached = shared_execution_cache.get(code, fingerprint)
+            if cached is not None:
+                if on_output is not None:
+                    on_output("stdout", cached.stdout)
+                    on_output("stderr", cached.stderr)
+                return cached
+        run = await self._run([code], timeout, on_output, distributions)
+        result = ExecutionResult(run.stdout[0], run.stderr[0], run.exit_code, run.timed_out, run.duration)
+        # Timeouts depend on load, not only on the code
+        if use_cache and not result.timed_out:
+            shared_execution_cache.put(code, fingerprint, result)
+        return result
+
+    async def _run(
+        self,
+        blocks: list[str],
+        timeout: float,
+        on_output: OutputCallback | None = None,
+        distributions: tuple[str, ...] = (),
+    ) -> "_Run":
+        async with self._interpreter(distributions) as python:
+            return await self._run_on(python, blocks, timeout, on_output)
+
+    async def _run_on(
+        self, python: str, blocks: list[str], timeout: float, on_output: OutputCallback | None
+    ) -> "_Run":
+        # GUI programs run headless for a frame budget instead of waiting for a window that never closes
+        source = "\n\n".join(blocks)
+        # Building a tkinter prelude may start Xvfb and wait for its socket; keep that off the event loop
+        prelude = await asyncio.to_thread(headless_prelude, source) if detect_gui(source) else None
+        marker = BLOCK_MARKER.encode() if len(blocks) > 1 else None
+
+        def _capture(name: str) -> SegmentedCapture:
+            on_text = (lambda text: on_output(name, text)) if on_output is not None else None
+            return SegmentedCapture(marker=marker, on_text=on_text)
+
+        stdout, stderr = _capture("stdout"), _capture("stderr")
+
+        async def _pump(stream: asyncio.StreamReader, capture: SegmentedCapture):
+            while chunk := await stream.read(READ_CHUNK_BYTES):
+                capture.write(chunk)
+            capture.close()
+
+        async def _communicate(worker: asyncio.subprocess.Process):
+            worker.stdin.write(json.dumps({"prelude": prelude, "blocks": blocks}).encode())
+            await worker.stdin.drain()
+            worker.stdin.close()
+            await asyncio.gather(_pump(worker.stdout, stdout), _pump(worker.stderr, stderr))
+            return await worker.wait()
+
+        async with self._semaphore:
+            worker = await self._take(python)
+            started = time.perf_counter()
+            exit_code, timed_out = None, False
+            try:
+                exit_code = await asyncio.wait_for(_communicate(worker), timeout=timeout)
+            except asyncio.TimeoutError:
+                # Whatever was printed before the deadline is already captured
+                timed_out = True
+                self._kill(worker)
+                await worker.wait()
+            except asyncio.CancelledError:
+                self._kill(worker)
+                raise
+            finally:
+                stdout.close()
+                stderr.close()
+            return _Run(stdout.values(), stderr.values(), exit_code, timed_out, time.perf_counter() - started)
+
+    async def run_blocks(
+        self,
+        blocks: list[str],
+        mode: str = "auto",
+        timeout: float = DEFAULT_TIMEOUT,
+        on_output: OutputCallback | None = None,
+    ) -> list[ExecutionResult]:
+        """
+        Run every code block and return one result per block (a single result for "concatenate").
+        "sequential" runs the blocks in order in one interpreter and stops at the first failure;
+        "concurrent" runs each block in its own worker; "auto" picks sequential only when the
+        blocks share names.
+        """
+        if mode not in BLOCK_MODES:
+            raise ValueError(f"Unknown block mode '{mode}', expected one of {BLOCK_MODES}")
+        if len(blocks) == 1:
+            return [await self.run(blocks[0], timeout, on_output=on_output)]
+        if mode == "auto":
+            mode = "sequential" if blocks_share_state(blocks) else "concurrent"
+        if mode == "concatenate":
+            return [await self.run("\n\n".join(blocks), timeout, on_output=on_output)]
+        if mode == "concurrent":
+            return list(await asyncio.gather(*(
+                self.run(b, timeout, on_output=_labelled(on_output, f"[block {i + 1}] ")) for i, b in enumerate(blocks)
+            )))
+        distributions = required_distributions("\n\n".join(blocks)) if self.resolve_dependencies else ()
+        return self._split(blocks, await self._run(blocks, timeout, on_output, distributions))
+
+    @staticmethod
+    def _split(blocks: list[str], run: "_Run") -> list[ExecutionResult]:
+        # Each started block opens a segment on both streams; the one before the first block is pre-import noise
+        stdouts, stderrs = run.stdout[1:], run.stderr[1:]
+        results = []
+        for i in range(len(blocks)):
+            if i == 0 and not stdouts:
+                # The program ended before any block started (e.g. the headless prelude skipped it); keep what it said
+                results.append(ExecutionResult(run.stdout[0], run.stderr[0], None, timed_out=run.timed_out, duration=run.duration))
+            elif i >= len(stdouts):
+                # Never reached: an earlier block failed, or ended the program on purpose (sys.exit(0))
+                reason = "exited the program" if run.exit_code == 0 and not run.timed_out else "failed"
+                results.append(ExecutionResult("", f"Skipped: an earlier block {reason}.", None))
+            elif i == len(stdouts) - 1:
+                # The last block that started ended the process
+                results.append(ExecutionResult(
+                    stdouts[i], stderrs[i] if i < len(stderrs) else "", run.exit_code,
+                    timed_out=run.timed_out, duration=run.duration,
+                ))
+            else:
+                results.append(ExecutionResult(stdouts[i], stderrs[i] if i < len(stderrs) else "", 0))
+        return results
+
+    async def aclose(self) -> None:
+        if self._reap_timer is not None:
+            self._reap_timer.cancel()
+        for task in self._replenishing.values():
+            task.cancel()
+        for idle in self._idle.values():
+            for worker in idle:
+                self._kill(worker)
+                await worker.wait()
+        self._idle.clear()
+
+
+def _labelled(on_output: OutputCallback | None, label: str) -> OutputCallback | None:
+    """Prefix every output line with `label`, so live output of concurrent blocks can be told apart."""
+    if on_output is None:
+        return None
+    at_line_start = {"stdout": True, "stderr": True}
+
+    def callback(stream: str, text: str) -> None:
+        if not text:
+            return
+        body = text.replace("\n", "\n" + label)
+        if text.endswith("\n"):
+            # The next line may come from another block; label it when it arrives
+            body = body[:-len(label)]
+        if at_line_start.get(stream, True):
+            body = label + body
+        at_line_start[stream] = text.endswith("\n")
+        on_output(stream, body)
+    return callback
+
+
+_pool: InterpreterPool | None = None
+
+
+def get_interpreter_pool() -> InterpreterPool:
+    global _pool
+    if _pool is None:
+        _pool = InterpreterPool()
+    return _pool
@@ -1,23 +1,24 @@
-TypeError: Can't instantiate abstract class CodeDebuggerAgent without an implementation for abstract methods 'get_response', 'invoke_stream'
-
 import asyncio
-import subprocess
-import tempfile
 import re
 import os
-import sys
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable
 
 from semantic_kernel.agents import (
     Agent,
+    AgentResponseItem,
     ChatCompletionAgent,
+    ChatHistoryAgentThread,
     MagenticOrchestration,
     StandardMagenticManager,
 )
 from semantic_kernel.agents.runtime import InProcessRuntime
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents import ChatMessageContent
 
+from connector_registry import create_chat_completion
+from handoff_orchestration import HANDOFF_PLUGIN_NAME, HandoffOrchestration
+from headless import headless_skip_reason
+from local_executor import get_interpreter_pool
+
 # =========================================================
 # 🧩 Compatibility fixes for SK 1.37 (.message, .text, .thread)
 # =========================================================
@@ -47,6 +48,20 @@ AZURE_OPENAI_ENDPOINT = "https://etiasandboxaifoundry.openai.azure.com/"
 AZURE_OPENAI_DEPLOYMENT_NAME = "gpt-4o"
 AZURE_OPENAI_API_VERSION = "2024-08-01-preview"
 
+EXECUTION_TIMEOUT = 20
+# How to run several ```python blocks: auto, sequential (shared interpreter), concurrent or concatenate
+CODE_BLOCK_MODE = os.getenv("CODE_BLOCK_MODE", "auto")
+
+# "magentic": a manager LLM plans and picks every turn; "handoff": each agent passes control with its
+# own transfer_to_<Agent> function call, so no manager round trip per turn
+ORCHESTRATION_MODE = os.getenv("ORCHESTRATION_MODE", "magentic")
+MAX_HANDOFF_HOPS = 8
+TASK = (
+    "CoderAgent should generate Python code that calculates ROI for a list of investments. "
+    "CodeDebuggerAgent should execute the code. "
+    "If any errors occur, CodeReviewerAgent must correct and re-submit the fixed code for execution."
+)
+
 agents_used = []
 
 
@@ -54,15 +69,47 @@ agents_used = []
 # 🧰 CodeDebuggerAgent (Executes + Reports back for fixes)
 # =========================================================
 class CodeDebuggerAgent(Agent):
-    def __init__(self):
+    # Receives execution output live, as partial messages, while the code runs
+    output_callback: Callable[[ChatMessageContent], None] | None = None
+
+    def __init__(self, output_callback: Callable[[ChatMessageContent], None] | None = None):
         super().__init__(
             name="CodeDebuggerAgent",
             description="Executes Python code locally, returns output, and reports errors for auto-fix.",
+            output_callback=output_callback,
         )
 
+    def _stream_output(self, stream: str, text: str) -> None:
+        if self.output_callback is not None and text:
+            self.output_callback(ChatMessageContent(
+                name=self.name, role="assistant", content=text, metadata={"partial": True, "stream": stream}
+            ))
+
+    @staticmethod
+    def _format_output(result) -> str:
+        if result.timed_out:
+            return f"⏱️ Code execution timed out ({EXECUTION_TIMEOUT}s limit)."
+        if result.exit_code == 0:
+            return result.stdout.strip() or "✅ Code executed successfully (no output)."
+        return result.stderr.strip()
+
     async def invoke(self, task, **kwargs) -> ChatMessageContent:
         return await self._execute_code(task, **kwargs)
 
+    async def invoke_stream(self, task, **kwargs):
+        yield await self._execute_code(task, **kwargs)
+
+    async def get_response(self, messages=None, arguments=None, **kwargs) -> AgentResponseItem:
+        """Handoff entry point: run the latest code and, when it fails, hand the report to CodeReviewerAgent."""
+        history = messages if isinstance(messages, list) else [messages] if messages else []
+        task = next((m for m in reversed(history) if "```" in (getattr(m, "content", None) or str(m))), "")
+        response = await self._execute_code(task, **kwargs)
+        # No LLM here to pick the transfer; the execution outcome decides it
+        handoff = self.kernel.plugins.get(HANDOFF_PLUGIN_NAME)
+        if response.metadata.get("failed") and handoff and "transfer_to_CodeReviewerAgent" in handoff:
+            await self.kernel.invoke(handoff["transfer_to_CodeReviewerAgent"], reason="Execution failed")
+        return AgentResponseItem(message=response, thread=ChatHistoryAgentThread())
+
     async def _execute_code(self, task, **kwargs) -> ChatMessageContent:
         thread = kwargs.get("thread", None)
 
@@ -76,42 +123,52 @@ class CodeDebuggerAgent(Agent):
         if not code_blocks:
             return ChatMessageContent(
                 name=self.name, role="assistant",
-                content="⚠️ No Python code block found to execute.", thread=thread
+                content="⚠️ No Python code block found to execute.", thread=thread,
+                metadata={"failed": False},
             )
 
-        code = code_blocks[0].strip()
+        blocks = [b.strip() for b in code_blocks]
 
+        failed, skipped = True, False
         try:
-            with tempfile.NamedTemporaryFile(mode="w+", suffix=".py", delete=False) as tf:
-                tf.write(code)
-                tf.flush()
-                path = tf.name
-
-            result = subprocess.run(
-                [sys.executable, path],
-                capture_output=True,
-                text=True,
-                timeout=20
+            # Pre-started interpreters from the pool: no per-run startup or import cost, and the
+            # event loop keeps dispatching to the other Magentic members while the code runs
+            # Output is captured size-capped (head + tail) so a runaway print loop cannot flood the chat history
+            results = await get_interpreter_pool().run_blocks(
+                blocks, mode=CODE_BLOCK_MODE, timeout=EXECUTION_TIMEOUT, on_output=self._stream_output
             )
-
-            if result.returncode == 0:
-                output = result.stdout.strip() or "✅ Code executed successfully (no output)."
-                summary = "Execution successful."
-            else:
-                output = result.stderr.strip()
+            # Skipped blocks (exit_code None, not timed out) are not failures of their own
+            failed = [i for i, r in enumerate(results) if r.timed_out or (r.exit_code is not None and not r.ok)]
+            not_run = [i for i, r in enumerate(results) if r.skipped]
+            gui_skip = next(filter(None, (headless_skip_reason(r.stdout) for r in results)), None)
+
+            if any(r.timed_out for r in results):
+                summary = "Execution failed due to timeout."
+            elif failed:
                 summary = "Execution failed. Please fix the code."
+            elif gui_skip is not None:
+                # Nothing was wrong with the code, but nothing was verified either
+                summary = f"Execution skipped: {gui_skip}. The code was not run."
+            elif not_run:
+                first = not_run[0] + 1
+                skipped_blocks = f"block {first}" if first == len(results) else f"blocks {first}..{len(results)}"
+                summary = (
+                    f"Execution stopped after block {first - 1}; {skipped_blocks} skipped."
+                    if first > 1 else "Execution stopped before any block ran."
+                )
+            else:
+                summary = "Execution successful."
+            if len(results) > 1 and failed:
+                summary = f"{summary} (block {failed[0] + 1} of {len(results)})"
+            skipped = not failed and (gui_skip is not None or bool(not_run))
+            output = "\n\n".join(
+                (f"Block {i + 1}:\n" if len(results) > 1 else "") + self._format_output(r)
+                for i, r in enumerate(results)
+            )
 
-        except subprocess.TimeoutExpired:
-            output = "⏱️ Code execution timed out (20s limit)."
-            summary = "Execution failed due to timeout."
         except Exception as e:
             output = f"❌ Runtime Error: {e}"
             summary = "Execution failed due to runtime exception."
-        finally:
-            try:
-                os.remove(path)
-            except Exception:
-                pass
 
         # Add structured context so another agent can fix code
         return ChatMessageContent(
@@ -122,17 +179,20 @@ class CodeDebuggerAgent(Agent):
                 "\nIf there was an error, please analyze it and fix the Python code."
             ),
             thread=thread,
+            metadata={"failed": bool(failed), "skipped": skipped},
         )
 
 
 # =========================================================
 # 🤖 Define Other Agents
 # =========================================================
-async def agents() -> list[Agent]:
-    base_service = AzureChatCompletion(
-        api_key=AZURE_OPENAI_API_KEY,
+async def agents(handoff: bool = False) -> list[Agent]:
+    # In handoff mode the LLM agents pass the code on themselves
+    send_to_debugger = " Then call transfer_to_CodeDebuggerAgent so it runs." if handoff else ""
+    base_service = create_chat_completion(
         endpoint=AZURE_OPENAI_ENDPOINT,
         deployment_name=AZURE_OPENAI_DEPLOYMENT_NAME,
+        api_key=AZURE_OPENAI_API_KEY,
         api_version=AZURE_OPENAI_API_VERSION,
     )
 
@@ -140,7 +200,7 @@ async def agents() -> list[Agent]:
         ChatCompletionAgent(
             name="CoderAgent",
             description="Writes Python code to solve problems.",
-            instructions="Write clean, correct Python code wrapped in ```python blocks```.",
+            instructions="Write clean, correct Python code wrapped in ```python blocks```." + send_to_debugger,
             service=base_service,
         ),
         ChatCompletionAgent(
@@ -149,11 +209,11 @@ async def agents() -> list[Agent]:
             instructions=(
                 "If CodeDebuggerAgent reports an error, analyze the traceback, "
                 "identify the cause, and return a corrected version of the code "
-                "in a ```python``` block."
+                "in a ```python``` block." + send_to_debugger
             ),
             service=base_service,
         ),
-        CodeDebuggerAgent(),
+        CodeDebuggerAgent(output_callback=agent_response_callback),
     ]
 
 
@@ -163,6 +223,10 @@ async def agents() -> list[Agent]:
 def agent_response_callback(msg: ChatMessageContent):
     name = getattr(msg, "name", "Unknown")
     text = getattr(msg, "content", "")
+    if (getattr(msg, "metadata", None) or {}).get("partial"):
+        # Live execution output: print as it arrives, the full message follows when the run ends
+        print(text, end="", flush=True)
+        return
     agents_used.append(name)
     print(f"\n🔹 {name} says:\n{text}\n")
 
@@ -170,14 +234,39 @@ def agent_response_callback(msg: ChatMessageContent):
 # =========================================================
 # 🚀 Main Orchestration Run
 # =========================================================
+async def run_handoff():
+    """CoderAgent → CodeDebuggerAgent → (CodeReviewerAgent → CodeDebuggerAgent)* by direct transfers."""
+    orchestration = HandoffOrchestration(agents=await agents(handoff=True), max_hops=MAX_HANDOFF_HOPS)
+    result = await orchestration.invoke(TASK, initial_agent="CoderAgent")
+    for message in result.messages[1:]:
+        agent_response_callback(message)
+    if result.trace:
+        print("🔀 Hops: " + " → ".join([result.trace[0].from_agent] + [h.to_agent for h in result.trace]))
+    if result.hop_limit_reached:
+        print(f"⚠️ Stopped after {MAX_HANDOFF_HOPS} hops.")
+    print("Agents involved:", ", ".join(agents_used))
+
+
 async def main():
+    # Start the interpreter pool while the agents plan, so the first execution is already warm
+    warming = asyncio.create_task(get_interpreter_pool().warm())
+    try:
+        if ORCHESTRATION_MODE == "handoff":
+            await run_handoff()
+        else:
+            await run_magentic()
+    finally:
+        await warming
+
+
+async def run_magentic():
     orchestration = MagenticOrchestration(
         members=await agents(),
         manager=StandardMagenticManager(
-            chat_completion_service=AzureChatCompletion(
-                api_key=AZURE_OPENAI_API_KEY,
+            chat_completion_service=create_chat_completion(
                 endpoint=AZURE_OPENAI_ENDPOINT,
                 deployment_name=AZURE_OPENAI_DEPLOYMENT_NAME,
+                api_key=AZURE_OPENAI_API_KEY,
                 api_version=AZURE_OPENAI_API_VERSION,
             )
         ),
@@ -189,11 +278,7 @@ async def main():
 
     try:
         orchestration_result = await orchestration.invoke(
-            task=(
-                "CoderAgent should generate Python code that calculates ROI for a list of investments. "
-                "CodeDebuggerAgent should execute the code. "
-                "If any errors occur, CodeReviewerAgent must correct and re-submit the fixed code for execution."
-            ),
+            task=TASK,
             runtime=runtime,
         )
 
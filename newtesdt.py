@@ -7,9 +7,10 @@ from semantic_kernel.agents import (
     StandardMagenticManager,
 )
 from semantic_kernel.agents.runtime import InProcessRuntime
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents import ChatMessageContent
 
+from connector_registry import create_chat_completion
+
 
 # Replace with your actual Azure OpenAI configuration
 AZURE_OPENAI_API_KEY = ""
@@ -21,10 +22,10 @@ AZURE_OPENAI_API_VERSION = "2024-08-01-preview"
 async def agents() -> list[Agent]:
     """Return a list of agents that will participate in the Magentic orchestration."""
 
-    base_service = AzureChatCompletion(
-        api_key=AZURE_OPENAI_API_KEY,
+    base_service = create_chat_completion(
         endpoint=AZURE_OPENAI_ENDPOINT,
         deployment_name=AZURE_OPENAI_DEPLOYMENT_NAME,
+        api_key=AZURE_OPENAI_API_KEY,
         api_version=AZURE_OPENAI_API_VERSION,
     )
 
@@ -105,10 +106,10 @@ async def main():
     magentic_orchestration = MagenticOrchestration(
         members=await agents(),
         manager=StandardMagenticManager(
-            chat_completion_service=AzureChatCompletion(
-                api_key=AZURE_OPENAI_API_KEY,
+            chat_completion_service=create_chat_completion(
                 endpoint=AZURE_OPENAI_ENDPOINT,
                 deployment_name=AZURE_OPENAI_DEPLOYMENT_NAME,
+                api_key=AZURE_OPENAI_API_KEY,
                 api_version=AZURE_OPENAI_API_VERSION,
             )
         ),
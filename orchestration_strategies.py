@@ -0,0 +1,421 @@
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Callable, Literal
+
+from pydantic import Field
+
+from semantic_kernel.agents import Agent
+from semantic_kernel.agents.strategies.selection.selection_strategy import SelectionStrategy
+from semantic_kernel.agents.strategies.termination.termination_strategy import TerminationStrategy
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.history_reducer.chat_history_reducer import ChatHistoryReducer
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.exceptions.agent_exceptions import AgentExecutionException
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.functions.kernel_function import KernelFunction
+from semantic_kernel.kernel import Kernel
+
+from decision_cache import DecisionCache, shared_decision_cache
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+except Exception:  # tiktoken is optional; fall back to the ~4 chars/token rule of thumb
+    _encoding = None
+
+logger = logging.getLogger(__name__)
+
+# Transition table key used for "the last message came from the user"
+USER_TURN = "user"
+
+# A termination predicate returns True (stop), False (keep going) or None (inconclusive)
+TerminationPredicate = Callable[[Agent, list[ChatMessageContent]], bool | None]
+
+EXIT_CODE_PATTERN = re.compile(r"(?:exit[ _]?code|return[ _]?code|returncode)\W{0,3}(-?\d+)", re.IGNORECASE)
+
+
+def last_speaker(history: list[ChatMessageContent]) -> str | None:
+    """Return the transition key for the last message: USER_TURN or the agent name."""
+    if not history:
+        return USER_TURN
+    last = history[-1]
+    if last.role == AuthorRole.USER:
+        return USER_TURN
+    return last.name
+
+
+# ---------------------------------------------------------------
+# History rendering for selector/terminator prompts
+# ---------------------------------------------------------------
+def count_tokens(messages: list[ChatMessageContent]) -> int:
+    text = "\n".join(f"{m.role}:{m.name or ''}:{m.content or ''}" for m in messages)
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4
+
+
+class PromptHistoryReducer(ChatHistoryReducer):
+    """
+    Bounds the `{{$history}}` a strategy prompt sees to the last `target_count` messages.
+    mode="window" passes those messages through unchanged; mode="compact" additionally reduces
+    each one to role + name + the first `preview_chars` characters, which is all a router needs.
+    Token counts before/after the last reduction are kept on `last_tokens_before`/`last_tokens_after`.
+    """
+
+    mode: Literal["window", "compact"] = "window"
+    preview_chars: int = 120
+    last_tokens_before: int = 0
+    last_tokens_after: int = 0
+
+    async def reduce(self) -> "PromptHistoryReducer | None":
+        history = list(self.messages)
+        reduced = history[-self.target_count:]
+        if self.mode == "compact":
+            reduced = [self._compact(m) for m in reduced]
+
+        self.last_tokens_before = count_tokens(history)
+        self.last_tokens_after = count_tokens(reduced)
+        logger.info(
+            f"Strategy history ({self.mode}): {len(history)} -> {len(reduced)} messages, "
+            f"{self.last_tokens_before} -> {self.last_tokens_after} tokens"
+        )
+        # Assign a new list: the strategies hand us the chat's own history list
+        self.messages = reduced
+        return self
+
+    def _compact(self, message: ChatMessageContent) -> ChatMessageContent:
+        content = (message.content or "").strip()
+        if len(content) > self.preview_chars:
+            content = content[:self.preview_chars] + f"… [{len(content)} chars]"
+        return ChatMessageContent(role=message.role, name=message.name, content=content)
+
+
+# ---------------------------------------------------------------
+# Selection
+# ---------------------------------------------------------------
+class TransitionTableSelectionStrategy(SelectionStrategy):
+    """
+    Pick the next agent from a fixed {last speaker -> next agent} table.
+    Only transitions missing from the table are sent to the fallback strategy (usually the LLM).
+    """
+
+    transitions: dict[str, str]
+    fallback: SelectionStrategy | None = None
+
+    async def select_agent(self, agents: list[Agent], history: list[ChatMessageContent]) -> Agent:
+        speaker = last_speaker(history)
+        next_name = self.transitions.get(speaker)
+        if next_name is not None:
+            agent = next((a for a in agents if a.name == next_name), None)
+            if agent is not None:
+                logger.debug(f"Transition table: {speaker} -> {next_name}")
+                return agent
+            logger.warning(f"Transition table names unknown agent '{next_name}'")
+
+        if self.fallback is None:
+            raise AgentExecutionException(f"No transition defined after '{speaker}' and no fallback strategy.")
+        logger.info(f"No transition after '{speaker}', asking fallback selector")
+        return await self.fallback.select_agent(agents, history)
+
+
+# ---------------------------------------------------------------
+# Termination
+# ---------------------------------------------------------------
+def _turn_since_user(history: list[ChatMessageContent]) -> list[ChatMessageContent]:
+    for i in range(len(history) - 1, -1, -1):
+        if history[i].role == AuthorRole.USER:
+            return history[i + 1:]
+    return list(history)
+
+
+def agent_replied(name: str | None = None, times: int = 1) -> TerminationPredicate:
+    """Stop once `name` (or any agent) has replied `times` times since the last user message."""
+    def predicate(agent: Agent, history: list[ChatMessageContent]) -> bool | None:
+        replies = [m for m in _turn_since_user(history) if name is None or m.name == name]
+        return True if len(replies) >= times else None
+    return predicate
+
+
+def agent_produced_output(name: str) -> TerminationPredicate:
+    """Stop when the last message is a non-empty reply from `name`."""
+    def predicate(agent: Agent, history: list[ChatMessageContent]) -> bool | None:
+        if not history or history[-1].name != name:
+            return None
+        return True if (history[-1].content or "").strip() else None
+    return predicate
+
+
+def exit_code(expected: int = 0) -> TerminationPredicate:
+    """Stop when the last message reports the expected exit/return code."""
+    def predicate(agent: Agent, history: list[ChatMessageContent]) -> bool | None:
+        if not history:
+            return None
+        match = EXIT_CODE_PATTERN.search(history[-1].content or "")
+        if match is None:
+            return None
+        return True if int(match.group(1)) == expected else None
+    return predicate
+
+
+def regex_match(pattern: str, stop: bool = True) -> TerminationPredicate:
+    """Return `stop` when the last message matches `pattern`."""
+    compiled = re.compile(pattern, re.IGNORECASE)
+
+    def predicate(agent: Agent, history: list[ChatMessageContent]) -> bool | None:
+        if history and compiled.search(history[-1].content or ""):
+            return stop
+        return None
+    return predicate
+
+
+class PredicateTerminationStrategy(TerminationStrategy):
+    """
+    Decide termination with cheap local predicates, evaluated in order.
+    The first conclusive predicate wins; the fallback strategy (usually the LLM judge) only runs
+    when every predicate is inconclusive.
+    """
+
+    predicates: list[TerminationPredicate]
+    fallback: TerminationStrategy | None = None
+
+    async def should_agent_terminate(self, agent: Agent, history: list[ChatMessageContent]) -> bool:
+        for predicate in self.predicates:
+            decision = predicate(agent, history)
+            if decision is not None:
+                logger.debug(f"Termination decided locally by {getattr(predicate, '__qualname__', predicate)}: {decision}")
+                return decision
+
+        if self.fallback is None:
+            return False
+        logger.info("Termination predicates inconclusive, asking fallback judge")
+        return await self.fallback.should_agent_terminate(agent, history)
+
+
+# ---------------------------------------------------------------
+# Combined select + terminate
+# ---------------------------------------------------------------
+@dataclass
+class RoutingDecision:
+    done: bool
+    next: str | None
+    # The "next" value as the model wrote it, for result parsers (e.g. "CodeWriter, CodeExecutor")
+    requested: str = ""
+
+
+def parse_routing_decision(value, agent_names: list[str]) -> RoutingDecision:
+    """Parse `{"done": bool, "next": "<agent>"}` from a function result value."""
+    if isinstance(value, list) and value:
+        value = value[0]
+    text = str(value or "").strip()
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    try:
+        data = json.loads(match.group(0) if match else text)
+    except (json.JSONDecodeError, TypeError):
+        logger.warning(f"Unparseable routing decision: {text!r}")
+        return RoutingDecision(done=False, next=None)
+    if not isinstance(data, dict):
+        return RoutingDecision(done=False, next=None)
+
+    done = data.get("done")
+    if isinstance(done, str):
+        done = done.strip().lower() in ("true", "yes", "1")
+    requested = str(data.get("next") or "")
+    # "next" may list several agents in order ("CodeWriter, CodeExecutor"); the first valid one acts now
+    by_name = {n.lower(): n for n in agent_names}
+    next_name = next((by_name[n] for n in (p.strip().lower() for p in requested.split(",")) if n in by_name), None)
+    return RoutingDecision(done=bool(done), next=next_name, requested=requested)
+
+
+class RoutingDecider:
+    """
+    Answers both "is the chat done?" and "who speaks next?" with one structured-output call.
+    The decision is cached for the current history, so the termination check after a turn and
+    the selection that follows it share a single LLM round trip.
+    """
+
+    def __init__(
+        self,
+        function: KernelFunction,
+        kernel: Kernel,
+        agent_names: list[str],
+        agent_variable_name: str = "agents",
+        history_variable_name: str = "history",
+        arguments: KernelArguments | None = None,
+        history_reducer: ChatHistoryReducer | None = None,
+    ):
+        self.function = function
+        self.kernel = kernel
+        self.agent_names = agent_names
+        self.agent_variable_name = agent_variable_name
+        self.history_variable_name = history_variable_name
+        self.arguments = arguments
+        self.history_reducer = history_reducer
+        self.calls = 0
+        self._cached_key = None
+        self._cached_decision: RoutingDecision | None = None
+
+    @staticmethod
+    def _history_key(history: list[ChatMessageContent]):
+        if not history:
+            return (0, None, None)
+        last = history[-1]
+        return (len(history), last.name, last.content)
+
+    async def decide(self, history: list[ChatMessageContent]) -> RoutingDecision:
+        key = self._history_key(history)
+        if key == self._cached_key and self._cached_decision is not None:
+            return self._cached_decision
+
+        if self.history_reducer is not None:
+            self.history_reducer.messages = history
+            reduced = await self.history_reducer.reduce()
+            if reduced is not None:
+                history = reduced.messages
+
+        messages = [message.to_dict(role_key="role", content_key="content") for message in history]
+        arguments = KernelArguments(
+            **(self.arguments or {}),
+            **{
+                self.agent_variable_name: ",".join(self.agent_names),
+                self.history_variable_name: messages,
+            },
+        )
+        if self.arguments is not None:
+            arguments.execution_settings = self.arguments.execution_settings
+        result = await self.function.invoke(kernel=self.kernel, arguments=arguments)
+        self.calls += 1
+
+        decision = parse_routing_decision(result.value if result else None, self.agent_names)
+        logger.info(f"Routing decision: done={decision.done}, next={decision.next}")
+        self._cached_key = key
+        self._cached_decision = decision
+        return decision
+
+    def reset(self) -> None:
+        self._cached_key = None
+        self._cached_decision = None
+
+
+class CombinedDecisionSelectionStrategy(SelectionStrategy):
+    """
+    Selection side of a RoutingDecider. `result_parser(decision, agents)` turns the cached decision
+    into candidate agents; when it names none (missing, unparseable or unknown "next"), the
+    `fallback` strategy picks instead.
+    """
+
+    decider: RoutingDecider
+    result_parser: Callable[[RoutingDecision, list[Agent]], list[Agent]] | None = None
+    fallback: SelectionStrategy | None = None
+
+    async def select_agent(self, agents: list[Agent], history: list[ChatMessageContent]) -> Agent:
+        decision = await self.decider.decide(history)
+        if self.result_parser is not None:
+            candidates = self.result_parser(decision, agents)
+        else:
+            candidates = [a for a in agents if a.name == decision.next]
+        if candidates:
+            return candidates[0]
+        if self.fallback is None:
+            raise AgentExecutionException(f"Routing decision named no valid agent: {decision.requested!r}")
+        logger.warning(f"Routing decision named no valid agent ({decision.requested!r}), using fallback selector")
+        return await self.fallback.select_agent(agents, history)
+
+
+class CombinedDecisionTerminationStrategy(TerminationStrategy):
+    """
+    Termination side of a RoutingDecider. `result_parser(decision)` reads "done" from the cached
+    decision. A decision that is not done but names no valid next agent ends the chat unless the
+    `fallback` selector can still pick one.
+    """
+
+    decider: RoutingDecider
+    result_parser: Callable[[RoutingDecision], bool] | None = None
+    fallback: SelectionStrategy | None = None
+
+    async def should_agent_terminate(self, agent: Agent, history: list[ChatMessageContent]) -> bool:
+        decision = await self.decider.decide(history)
+        done = self.result_parser(decision) if self.result_parser is not None else decision.done
+        if done or decision.next is not None:
+            return done
+        if self.fallback is None:
+            logger.warning("Routing decision named no next agent and there is no fallback; ending the chat")
+            return True
+        try:
+            await self.fallback.select_agent(self.agents or [agent], history)
+        except AgentExecutionException:
+            logger.warning("Routing decision named no next agent and the fallback has none either; ending the chat")
+            return True
+        return False
+
+
+# ---------------------------------------------------------------
+# Decision caching
+# ---------------------------------------------------------------
+def history_fingerprint(history: list[ChatMessageContent], window: int = 6, namespace: str = "") -> str:
+    """Stable hash of the last `window` messages, ignoring case, whitespace and punctuation."""
+    h = hashlib.sha256(namespace.encode("utf-8"))
+    for message in history[-window:]:
+        content = re.sub(r"[^\w]+", " ", (message.content or "").lower()).strip()
+        h.update(f"\x1e{message.role}\x1f{message.name or ''}\x1f{content}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class CachedSelectionStrategy(SelectionStrategy):
+    """Memoizes the wrapped strategy's choice by a fingerprint of the recent history."""
+
+    inner: SelectionStrategy
+    cache: DecisionCache = Field(default_factory=lambda: shared_decision_cache)
+    window: int = 6
+    namespace: str = "select"
+    # Keys this strategy wrote, so a chat reset can forget its own decisions in a shared cache
+    written: set[str] = Field(default_factory=set, exclude=True)
+
+    async def select_agent(self, agents: list[Agent], history: list[ChatMessageContent]) -> Agent:
+        names = ",".join(a.name for a in agents)
+        key = history_fingerprint(history, self.window, f"{self.namespace}|{names}")
+        cached = self.cache.get(key)
+        if cached is not None:
+            agent = next((a for a in agents if a.name == cached), None)
+            if agent is not None:
+                return agent
+
+        agent = await self.inner.select_agent(agents, history)
+        self.cache.put(key, agent.name)
+        self.written.add(key)
+        return agent
+
+    def forget(self) -> int:
+        """Drop this strategy's decisions from the cache; other chats' entries stay."""
+        dropped = self.cache.discard(self.written)
+        self.written.clear()
+        return dropped
+
+
+class CachedTerminationStrategy(TerminationStrategy):
+    """Memoizes the wrapped strategy's verdict by a fingerprint of the recent history."""
+
+    inner: TerminationStrategy
+    cache: DecisionCache = Field(default_factory=lambda: shared_decision_cache)
+    window: int = 6
+    namespace: str = "terminate"
+    written: set[str] = Field(default_factory=set, exclude=True)
+
+    async def should_agent_terminate(self, agent: Agent, history: list[ChatMessageContent]) -> bool:
+        key = history_fingerprint(history, self.window, f"{self.namespace}|{agent.name}")
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        decision = await self.inner.should_agent_terminate(agent, history)
+        self.cache.put(key, decision)
+        self.written.add(key)
+        return decision
+
+    def forget(self) -> int:
+        """Drop this strategy's decisions from the cache; other chats' entries stay."""
+        dropped = self.cache.discard(self.written)
+        self.written.clear()
+        return dropped
@@ -0,0 +1,131 @@
+import codecs
+import os
+from typing import Any, Callable
+
+# Output kept per stream: the first HEAD and last TAIL bytes; everything in between is dropped and counted
+OUTPUT_HEAD_BYTES = int(os.getenv("CODE_OUTPUT_HEAD_BYTES", "4000"))
+OUTPUT_TAIL_BYTES = int(os.getenv("CODE_OUTPUT_TAIL_BYTES", "4000"))
+
+
+def truncation_marker(omitted: int, total: int) -> str:
+    return f"\n... [{omitted} bytes truncated, {total} bytes total] ...\n"
+
+
+class HeadTailBuffer:
+    """Keeps the first `head` and last `tail` bytes written, so memory stays bounded however much is printed."""
+
+    def __init__(self, head: int = OUTPUT_HEAD_BYTES, tail: int = OUTPUT_TAIL_BYTES):
+        self.head = head
+        self.tail = tail
+        self.total = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    def write(self, data: bytes) -> bytes:
+        """Append `data`; returns the part that went into the head (what a live reader should see)."""
+        self.total += len(data)
+        room = self.head - len(self._head)
+        accepted = data[:room] if room > 0 else b""
+        self._head += accepted
+        rest = data[len(accepted):]
+        if rest and self.tail > 0:
+            self._tail += rest[-self.tail:]
+            if len(self._tail) > self.tail:
+                del self._tail[:len(self._tail) - self.tail]
+        return accepted
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self._head) + len(self._tail)
+
+    def getvalue(self) -> str:
+        head = self._head.decode(errors="replace")
+        tail = self._tail.decode(errors="replace")
+        if not self.truncated:
+            return head + tail
+        return head + truncation_marker(self.total - len(self._head) - len(self._tail), self.total) + tail
+
+
+class SegmentedCapture:
+    """
+    Streams one process output into a HeadTailBuffer per segment, starting a new segment at every
+    `marker` (which may arrive split across reads). `on_text` receives the kept head text as it
+    arrives, and a single notice once a segment starts being truncated.
+    """
+
+    def __init__(
+        self,
+        marker: bytes | None = None,
+        head: int = OUTPUT_HEAD_BYTES,
+        tail: int = OUTPUT_TAIL_BYTES,
+        on_text: Callable[[str], None] | None = None,
+    ):
+        self.marker = marker
+        self.head = head
+        self.tail = tail
+        self.on_text = on_text
+        self.segments = [HeadTailBuffer(head, tail)]
+        self._pending = b""
+        self._notified = False
+        # Chunks can end inside a multi-byte character
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def write(self, data: bytes) -> None:
+        if not self.marker:
+            self._write_segment(data)
+            return
+        parts = (self._pending + data).split(self.marker)
+        self._pending = b""
+        for i, part in enumerate(parts):
+            if i > 0:
+                self.segments.append(HeadTailBuffer(self.head, self.tail))
+                self._notified = False
+            if i == len(parts) - 1:
+                # Hold back a possible start of the next marker until the next read
+                keep = next((n for n in range(len(self.marker) - 1, 0, -1) if part.endswith(self.marker[:n])), 0)
+                if keep:
+                    part, self._pending = part[:-keep], part[-keep:]
+            self._write_segment(part)
+
+    def close(self) -> None:
+        if self._pending:
+            self._write_segment(self._pending)
+            self._pending = b""
+
+    def _write_segment(self, data: bytes) -> None:
+        if not data:
+            return
+        segment = self.segments[-1]
+        accepted = segment.write(data)
+        if self.on_text is None:
+            return
+        if accepted:
+            self.on_text(self._decoder.decode(accepted))
+        if len(accepted) < len(data) and not self._notified:
+            self._notified = True
+            self.on_text(f"\n... [output over {self.head} bytes, live output stopped] ...\n")
+
+    def values(self) -> list[str]:
+        return [s.getvalue() for s in self.segments]
+
+
+def cap_text(text: str, head: int = OUTPUT_HEAD_BYTES, tail: int = OUTPUT_TAIL_BYTES) -> str:
+    buffer = HeadTailBuffer(head, tail)
+    buffer.write(text.encode())
+    return buffer.getvalue()
+
+
+def cap_output_fields(value: Any, fields: tuple[str, ...] = ("stdout", "stderr")) -> Any:
+    """
+    Cap the output streams of a session pool response (properties.stdout/stderr, or top-level
+    stdout/stderr). Everything else, such as base64 images in executionResult, is left intact.
+    """
+    if not isinstance(value, dict):
+        return value
+    capped = dict(value)
+    for name in fields:
+        if isinstance(capped.get(name), str):
+            capped[name] = cap_text(capped[name])
+    if isinstance(capped.get("properties"), dict):
+        capped["properties"] = cap_output_fields(capped["properties"], fields)
+    return capped
@@ -0,0 +1,216 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable
+
+from semantic_kernel.agents import Agent
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.functions.kernel_function import KernelFunction
+from semantic_kernel.kernel import Kernel
+
+from decision_cache import DecisionCache
+
+logger = logging.getLogger(__name__)
+
+# Output that means an execution step did not succeed, e.g. "Execution failed", a traceback or a non-zero exit code
+STEP_FAILURE_PATTERN = re.compile(r"traceback \(most recent call last\)|execution failed|exit[ _]?code\W{0,3}[1-9]", re.IGNORECASE)
+
+PLANNER_PROMPT = """
+You are a planner for a team of agents.
+Agents:
+{{$agents}}
+
+Compile the user request into a small DAG of agent steps. Steps that only depend on earlier
+steps (for example review and execute, which both only need the written code) must not depend
+on each other so they can run in parallel. Use as few steps as possible.
+{{$failure}}
+Respond ONLY with JSON:
+{"steps": [{"id": "<short id>", "agent": "<agent name>", "instruction": "<what to do>", "depends_on": ["<id>", ...]}]}
+
+User request:
+{{$request}}
+"""
+
+
+class PlanError(Exception):
+    pass
+
+
+@dataclass
+class PlanStep:
+    id: str
+    agent: str
+    instruction: str
+    depends_on: list[str] = field(default_factory=list)
+
+
+@dataclass
+class Plan:
+    steps: list[PlanStep]
+
+    def waves(self, completed: set[str] | None = None) -> list[list[PlanStep]]:
+        """Group steps into waves; every step in a wave only depends on earlier waves (or `completed` ids)."""
+        remaining = {s.id: s for s in self.steps}
+        done: set[str] = set(completed or ())
+        waves = []
+        while remaining:
+            ready = [s for s in remaining.values() if all(d in done for d in s.depends_on)]
+            if not ready:
+                raise PlanError(f"Plan has a cycle or unknown dependency among: {sorted(remaining)}")
+            waves.append(ready)
+            for s in ready:
+                done.add(s.id)
+                del remaining[s.id]
+        return waves
+
+
+@dataclass
+class StepResult:
+    step: PlanStep
+    content: str
+    failed: bool = False
+
+
+def parse_plan(value, agent_names: list[str], completed: set[str] | None = None) -> Plan:
+    if isinstance(value, list) and value:
+        value = value[0]
+    text = str(value or "")
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    try:
+        data = json.loads(match.group(0) if match else text)
+        raw_steps = data["steps"]
+    except (json.JSONDecodeError, KeyError, TypeError) as ex:
+        raise PlanError(f"Unparseable plan: {text!r}") from ex
+
+    by_lower = {n.lower(): n for n in agent_names}
+    steps = []
+    for i, raw in enumerate(raw_steps):
+        agent = by_lower.get(str(raw.get("agent", "")).strip().lower())
+        if agent is None:
+            raise PlanError(f"Plan step uses unknown agent: {raw.get('agent')}")
+        steps.append(PlanStep(
+            id=str(raw.get("id") or f"step{i + 1}"),
+            agent=agent,
+            instruction=str(raw.get("instruction", "")),
+            depends_on=[str(d) for d in raw.get("depends_on", [])],
+        ))
+    plan = Plan(steps=steps)
+    plan.waves(completed)  # validate
+    return plan
+
+
+def _describe(agent: Agent) -> str:
+    if agent.description:
+        return agent.description
+    lines = [line.strip() for line in (agent.instructions or "").splitlines() if line.strip()]
+    return " ".join(lines[:3])
+
+
+def default_step_failed(step: PlanStep, content: str) -> bool:
+    return bool(STEP_FAILURE_PATTERN.search(content))
+
+
+class Planner:
+    """Compiles a request into a Plan with one LLM call; plans are cached by normalized request."""
+
+    def __init__(self, function: KernelFunction, kernel: Kernel, agents: list[Agent], cache: DecisionCache | None = None):
+        self.function = function
+        self.kernel = kernel
+        self.agents = agents
+        self.cache = cache if cache is not None else DecisionCache(max_entries=256, ttl_seconds=3600)
+        self.calls = 0
+
+    @staticmethod
+    def _key(request: str) -> str:
+        normalized = re.sub(r"[^\w]+", " ", request.lower()).strip()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    async def plan(self, request: str, failure: str | None = None, completed: set[str] | None = None) -> Plan:
+        key = self._key(request)
+        if failure is None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        arguments = KernelArguments(
+            agents="\n".join(f"- {a.name}: {_describe(a)}" for a in self.agents),
+            request=request,
+            failure=(f"A previous plan failed: {failure}\nPlan the remaining work to fix it." if failure else ""),
+        )
+        result = await self.function.invoke(kernel=self.kernel, arguments=arguments)
+        self.calls += 1
+        plan = parse_plan(result.value if result else None, [a.name for a in self.agents], completed)
+        logger.info(f"Plan: {' | '.join(f'{s.id}:{s.agent}<-{s.depends_on}' for s in plan.steps)}")
+        if failure is None:
+            self.cache.put(key, plan)
+        return plan
+
+
+class PlanOrchestration:
+    """
+    Runs a request as a planned DAG of agent steps instead of choosing the next agent every turn.
+    Independent steps in a wave run concurrently. When a step fails, the remaining work is
+    re-planned (at most `max_replans` times) with the failure and completed outputs as context.
+    """
+
+    def __init__(
+        self,
+        planner: Planner,
+        agents: list[Agent],
+        max_replans: int = 1,
+        step_failed: Callable[[PlanStep, str], bool] = default_step_failed,
+    ):
+        self.planner = planner
+        self.agents = {a.name: a for a in agents}
+        self.max_replans = max_replans
+        self.step_failed = step_failed
+
+    async def _run_step(self, step: PlanStep, request: str, results: dict[str, StepResult]) -> StepResult:
+        messages = [ChatMessageContent(role=AuthorRole.USER, content=request)]
+        for dep in step.depends_on:
+            if dep in results:
+                messages.append(ChatMessageContent(
+                    role=AuthorRole.ASSISTANT, name=results[dep].step.agent, content=results[dep].content
+                ))
+        messages.append(ChatMessageContent(role=AuthorRole.USER, content=step.instruction))
+        try:
+            response = await self.agents[step.agent].get_response(messages=messages)
+            content = str(response.message.content or "")
+        except Exception as ex:
+            logger.exception(f"Plan step {step.id} ({step.agent}) raised")
+            return StepResult(step=step, content=f"{type(ex).__name__}: {ex}", failed=True)
+        return StepResult(step=step, content=content, failed=self.step_failed(step, content))
+
+    async def invoke(self, request: str, on_step: Callable[[StepResult], None] | None = None) -> list[StepResult]:
+        plan = await self.planner.plan(request)
+        results: dict[str, StepResult] = {}
+        replans = 0
+
+        while True:
+            failure = None
+            for wave in plan.waves(set(results)):
+                wave_results = await asyncio.gather(*(self._run_step(s, request, results) for s in wave))
+                for r in wave_results:
+                    results[r.step.id] = r
+                    if on_step is not None:
+                        on_step(r)
+                failed = [r for r in wave_results if r.failed]
+                if failed:
+                    failure = "; ".join(f"{r.step.id} ({r.step.agent}): {r.content[:500]}" for r in failed)
+                    break
+
+            if failure is None or replans >= self.max_replans:
+                return list(results.values())
+
+            replans += 1
+            logger.info(f"Re-planning after failure ({replans}/{self.max_replans}): {failure[:200]}")
+            # Completed steps stay available as dependencies; the new plan covers only the remaining work
+            results = {k: v for k, v in results.items() if not v.failed}
+            completed = "\n".join(f"- {r.step.id} ({r.step.agent})" for r in results.values())
+            failure = f"{failure}\nCompleted steps you may depend on by id:\n{completed or '- none'}"
+            plan = await self.planner.plan(request, failure=failure, completed=set(results))
@@ -0,0 +1,158 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable
+
+from decision_cache import DecisionCache
+
+logger = logging.getLogger(__name__)
+
+# Receives the progress events of a run (see agentic2.EventCallback)
+EventCallback = Callable[[dict], None]
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+# Larger responses are returned but not kept, so a few huge outputs cannot crowd out the rest
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case, Unicode form and whitespace differences do not change what the agents are asked to do."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", prompt).casefold()).strip()
+
+
+def config_fingerprint(*parts: Any) -> str:
+    """Hash of everything besides the prompt that shapes a response (model, instructions, run options)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+class _EventFanout:
+    """Progress events of one shared run, delivered to every caller waiting on it; late joiners get a replay."""
+
+    def __init__(self):
+        self.events: list[dict] = []
+        self.listeners: list[EventCallback] = []
+
+    def emit(self, event: dict) -> None:
+        self.events.append(event)
+        for listener in list(self.listeners):
+            try:
+                listener(event)
+            except Exception:
+                # One caller's broken callback must not fail the run the others are waiting on
+                logger.exception("Event listener failed")
+
+    def add(self, listener: EventCallback) -> None:
+        for event in self.events:
+            listener(event)
+        self.listeners.append(listener)
+
+    def remove(self, listener: EventCallback) -> None:
+        self.listeners.remove(listener)
+
+
+class ResponseCache:
+    """
+    Cache of complete responses keyed by normalized prompt and config fingerprint, bounded by entry
+    count, TTL and per-entry size. Concurrent misses for the same key share one in-flight run,
+    which is cancelled when the last caller waiting on it is cancelled. The run's progress events
+    reach every waiting caller's `on_event`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        max_entry_bytes: int = RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    ):
+        self._cache = DecisionCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.max_entry_bytes = max_entry_bytes
+        self.coalesced = 0
+        self._running: dict[str, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self._fanouts: dict[asyncio.Task, _EventFanout] = {}
+
+    @staticmethod
+    def key(prompt: str, fingerprint: str) -> str:
+        return hashlib.sha256(f"{fingerprint}\x1e{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+    async def get_or_run(
+        self, key: str, run: Callable[[EventCallback], Awaitable[Any]], on_event: EventCallback | None = None
+    ) -> tuple[Any, str]:
+        """
+        The response for `key` and how it was obtained: "hit", "coalesced" or "miss" (ran `run`).
+        `run(emit)` reports progress through `emit`, which forwards to the `on_event` of every caller
+        waiting on that run, including callers that join it later.
+        """
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached, "hit"
+        task = self._running.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await self._wait(key, task, on_event), "coalesced"
+        fanout = _EventFanout()
+        task = asyncio.create_task(self._run(key, run, fanout.emit))
+        self._running[key] = task
+        self._fanouts[task] = fanout
+        task.add_done_callback(lambda t: self._run_done(key, t))
+        return await self._wait(key, task, on_event), "miss"
+
+    async def _wait(self, key: str, task: asyncio.Task, on_event: EventCallback | None) -> Any:
+        # One caller going away must not cancel the run the others are waiting on, but the last one does
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        fanout = self._fanouts.get(task)
+        if fanout is not None and on_event is not None:
+            fanout.add(on_event)
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if fanout is not None and on_event is not None:
+                fanout.remove(on_event)
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Later requests for the key start a fresh run instead of joining the cancelled one
+                    if self._running.get(key) is task:
+                        del self._running[key]
+                    task.cancel()
+                    await asyncio.wait([task])
+
+    def _run_done(self, key: str, task: asyncio.Task) -> None:
+        if self._running.get(key) is task:
+            del self._running[key]
+        self._fanouts.pop(task, None)
+        # Every waiter may have gone away; retrieve the exception so it is not reported as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    async def _run(self, key: str, run: Callable[[EventCallback], Awaitable[Any]], emit: EventCallback) -> Any:
+        result = await run(emit)
+        # Failed runs raise and are never stored; empty results are usually a transient model failure
+        if result is not None:
+            size = len(json.dumps(result, default=str))
+            if size <= self.max_entry_bytes:
+                self._cache.put(key, result)
+            else:
+                logger.info(f"Response of {size} bytes not cached (limit {self.max_entry_bytes})")
+        return result
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def summary(self) -> str:
+        return (
+            f"response cache entries={len(self._cache)} hits={self._cache.hits} "
+            f"misses={self._cache.misses} coalesced={self.coalesced} in_flight={len(self._running)}"
+        )
+
+
+# Shared by every request in this process
+shared_response_cache = ResponseCache()
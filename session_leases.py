@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Keep below the session pool's cooldownPeriodInSeconds so a lease never outlives its session
+DEFAULT_IDLE_TTL_SECONDS = 240
+DEFAULT_WARM_POOL_SIZE = 2
+DEFAULT_MAX_LEASES = 1000
+
+
+@dataclass
+class SessionLease:
+    session_id: str
+    conversation_id: str
+    last_used: float = field(default_factory=time.monotonic)
+    executions: int = 0
+
+
+class SessionLeaseManager:
+    """
+    Maps a conversation to one dynamic session identifier so its follow-up executions reuse the same
+    warm interpreter. New conversations take a pre-warmed identifier when one is available.
+    Identifiers are never handed to a second conversation; idle leases are retired after `idle_ttl`.
+    """
+
+    def __init__(
+        self,
+        warm: Callable[[str], Awaitable[None]] | None = None,
+        idle_ttl: float = DEFAULT_IDLE_TTL_SECONDS,
+        warm_pool_size: int = DEFAULT_WARM_POOL_SIZE,
+        max_leases: int = DEFAULT_MAX_LEASES,
+    ):
+        self.warm = warm
+        self.idle_ttl = idle_ttl
+        self.warm_pool_size = warm_pool_size
+        self.max_leases = max_leases
+        self._leases: OrderedDict[str, SessionLease] = OrderedDict()
+        self._warm_ids: OrderedDict[str, float] = OrderedDict()
+        self._filling: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self, conversation_id: str | None = None) -> str:
+        """Session identifier for `conversation_id`; a one-off identifier when it is None."""
+        self.expire()
+        if conversation_id is not None:
+            lease = self._leases.get(conversation_id)
+            if lease is not None:
+                self.hits += 1
+                lease.last_used = time.monotonic()
+                lease.executions += 1
+                self._leases.move_to_end(conversation_id)
+                return lease.session_id
+
+        self.misses += 1
+        session_id = self._take_warm() or str(uuid.uuid4())
+        if conversation_id is not None:
+            self._leases[conversation_id] = SessionLease(session_id, conversation_id, executions=1)
+            while len(self._leases) > self.max_leases:
+                self._leases.popitem(last=False)
+        self._schedule_fill()
+        return session_id
+
+    def release(self, conversation_id: str) -> None:
+        self._leases.pop(conversation_id, None)
+
+    def expire(self) -> None:
+        cutoff = time.monotonic() - self.idle_ttl
+        # Leases are kept in last-used order, so the idle ones are at the front
+        while self._leases:
+            lease = next(iter(self._leases.values()))
+            if lease.last_used > cutoff:
+                break
+            logger.debug(f"Retiring idle session {lease.session_id} for {lease.conversation_id}")
+            self._leases.popitem(last=False)
+        while self._warm_ids and next(iter(self._warm_ids.values())) <= cutoff:
+            self._warm_ids.popitem(last=False)
+
+    def _take_warm(self) -> str | None:
+        if not self._warm_ids:
+            return None
+        session_id, _ = self._warm_ids.popitem(last=False)
+        return session_id
+
+    def _schedule_fill(self) -> None:
+        if self.warm is None or self.warm_pool_size <= 0:
+            return
+        if self._filling is None or self._filling.done():
+            try:
+                self._filling = asyncio.get_running_loop().create_task(self.fill())
+            except RuntimeError:
+                pass  # No running loop; the pool is filled on the next async call
+
+    async def fill(self) -> None:
+        """Allocate sessions until `warm_pool_size` unused identifiers are ready."""
+        missing = self.warm_pool_size - len(self._warm_ids)
+        if self.warm is None or missing <= 0:
+            return
+
+        async def _warm_one():
+            session_id = str(uuid.uuid4())
+            try:
+                await self.warm(session_id)
+            except Exception as ex:
+                logger.warning(f"Failed to pre-warm session {session_id}: {ex}")
+                return
+            self._warm_ids[session_id] = time.monotonic()
+
+        await asyncio.gather(*(_warm_one() for _ in range(missing)))
+
+    def summary(self) -> str:
+        return f"session leases={len(self._leases)} warm={len(self._warm_ids)} hits={self.hits} misses={self.misses}"
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+
+import httpx
+
+from headless import with_headless_prelude
+from output_capture import cap_output_fields
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXECUTION_TIMEOUT = 300.0
+
+
+class SessionPoolClient:
+    """
+    Async client for the Azure Container Apps session pool.
+    One pooled httpx.AsyncClient is shared by every execution, so a worker can keep many
+    executions in flight without blocking its event loop. Each call has its own deadline and
+    is cancelled cleanly when the awaiting task is cancelled.
+    """
+
+    def __init__(self, timeout: float = DEFAULT_EXECUTION_TIMEOUT, max_connections: int = 50):
+        self.timeout = timeout
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+        )
+
+    async def execute(
+        self, url: str, code: str, token: str, timeout: float | None = None, identifier: str | None = None
+    ) -> dict:
+        """
+        POST `code` to `url`, in the dynamic session `identifier` when given.
+        Raises httpx.HTTPError on failure and asyncio.TimeoutError past the deadline.
+        """
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+        deadline = timeout or self.timeout
+        # GUI programs (pygame/tkinter) run headless for a frame budget instead of until the deadline
+        code = with_headless_prelude(code)
+        params = {"identifier": identifier} if identifier else None
+        try:
+            resp = await asyncio.wait_for(
+                self._http.post(url, headers=headers, params=params, json={"code": code}, timeout=deadline),
+                timeout=deadline,
+            )
+            resp.raise_for_status()
+            # The response carries the full stdout/stderr; keep only head and tail before it reaches a chat history
+            return cap_output_fields(resp.json())
+        except asyncio.TimeoutError:
+            logger.error(f"Code execution exceeded its {deadline}s deadline")
+            raise
+        except asyncio.CancelledError:
+            logger.info("Code execution cancelled")
+            raise
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+_client: SessionPoolClient | None = None
+
+
+def get_session_pool_client() -> SessionPoolClient:
+    """Process-wide client; httpx connection pools are safe to share between tasks on one loop."""
+    global _client
+    if _client is None:
+        _client = SessionPoolClient()
+    return _client
@@ -1,46 +1,62 @@
-def get_container_app_token(scope: str = "https://dynamicsessions.io/.default"):
-    """Get Managed Identity token for Azure Container Apps Session Pool API."""
+import asyncio
+import logging
+import os
+
+import httpx
+
+from session_leases import SessionLeaseManager
+from session_pool_client import get_session_pool_client
+from token_manager import SESSION_POOL_SCOPE, get_token_manager
+
+
+async def get_container_app_token(scope: str = SESSION_POOL_SCOPE):
+    """Get Managed Identity token for Azure Container Apps Session Pool API (cached, refreshed before expiry)."""
     try:
-        token = default_credential.get_token(scope)
-        return token.token
+        return await get_token_manager().get_token(scope)
     except Exception as ex:
         logging.error(f"Failed to obtain managed identity token for session pool: {ex}")
         raise
 
 
-def execute_code_in_container(code: str):
+def _session_pool_url() -> str:
     """
-    Send code to Azure Container App Session Pool for execution.
-    Assumes env variables:
+    Session pool execute URL. Assumes env variables:
       - SESSION_POOL_NAME
       - SESSION_POOL_ENV_ID
       - SESSION_POOL_REGION
-      - SESSION_ID (or we generate one)
       - EXECUTE_PATH (e.g. '/execute')
     """
     session_pool_name = os.getenv("SESSION_POOL_NAME")
     env_id = os.getenv("SESSION_POOL_ENV_ID")
     region = os.getenv("SESSION_POOL_REGION", "eastus")
-    session_id = os.getenv("SESSION_ID", str(uuid.uuid4()))
     execute_path = os.getenv("EXECUTE_PATH", "/execute")
+    return f"https://{session_pool_name}.{env_id}.{region}.azurecontainerapps.io{execute_path}"
 
-    # Build the full session pool URL
-    base_url = f"https://{session_pool_name}.{env_id}.{region}.azurecontainerapps.io"
-    url = f"{base_url}{execute_path}?identifier={session_id}"
 
-    # Get a token for the dynamic sessions audience
-    token = get_container_app_token()
+async def _warm_session(session_id: str) -> None:
+    # A trivial execution makes the pool allocate the session ahead of the first real request
+    token = await get_container_app_token()
+    await get_session_pool_client().execute(_session_pool_url(), "pass", token, identifier=session_id)
+
 
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json"
-    }
-    payload = {"code": code}
+session_leases = SessionLeaseManager(warm=_warm_session)
+
+
+async def execute_code_in_container(code: str, timeout: float | None = None, conversation_id: str | None = None):
+    """
+    Send code to Azure Container App Session Pool for execution.
+    Executions with the same `conversation_id` share one dynamic session (and its interpreter state);
+    SESSION_ID in the environment pins every execution to one session.
+    """
+    session_id = os.getenv("SESSION_ID") or session_leases.acquire(conversation_id)
+
+    # Get a token for the dynamic sessions audience
+    token = await get_container_app_token()
 
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=300)
-        resp.raise_for_status()
-        return resp.json()
-    except requests.RequestException as e:
+        return await get_session_pool_client().execute(
+            _session_pool_url(), code, token, timeout=timeout, identifier=session_id
+        )
+    except (httpx.HTTPError, asyncio.TimeoutError) as e:
         logging.error(f"Error executing code in container app session pool: {e}")
         raise
@@ -1,3 +1,6 @@
+"""
+Example requests and the agents they should involve:
+
 Prompt #1:
 I’m working in a large enterprise and need to demonstrate how Semantic Kernel can orchestrate multiple agents. Write a Python script that identifies the most financially valuable opportunities for the enterprise, then execute the code to verify it runs without errors.
 Agents involved: 1 → 2
@@ -9,23 +12,44 @@ Agents involved: 1 → 3
 Prompt #3:
 I’m working in a large enterprise hackathon. Write Python code for a ping pong game, execute it to confirm it works correctly, and then publish the completed app.
 Agents involved: 1 → 2 → 3
-
+"""
 
 import asyncio
 import dotenv
 import logging
 from semantic_kernel import Kernel
 from semantic_kernel.agents import AgentGroupChat, ChatCompletionAgent
-from semantic_kernel.agents.strategies.selection.kernel_function_selection_strategy import KernelFunctionSelectionStrategy
-from semantic_kernel.agents.strategies.termination.kernel_function_termination_strategy import KernelFunctionTerminationStrategy
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import AzureChatPromptExecutionSettings
-from semantic_kernel.connectors.ai.open_ai.services.azure_chat_completion import AzureChatCompletion
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.exceptions.agent_exceptions import AgentChatException, AgentExecutionException
 from semantic_kernel.functions.kernel_function_from_prompt import KernelFunctionFromPrompt
 
 from local_python_plugin3 import LocalPythonPlugin  # Your local code execution plugin
+from connector_registry import create_chat_completion, warm_up
+from intent_router import (
+    IntentRouter,
+    IntentRouterSelectionStrategy,
+    RouterGuessSelectionStrategy,
+    load_logged_decisions,
+    load_prompt_examples,
+)
+from orchestration_strategies import (
+    CachedSelectionStrategy,
+    CachedTerminationStrategy,
+    CombinedDecisionSelectionStrategy,
+    CombinedDecisionTerminationStrategy,
+    PredicateTerminationStrategy,
+    PromptHistoryReducer,
+    RoutingDecider,
+    RoutingDecision,
+    TransitionTableSelectionStrategy,
+    agent_replied,
+    shared_decision_cache,
+)
+from plan_orchestration import PLANNER_PROMPT, PlanError, PlanOrchestration, Planner
+from handoff_orchestration import HandoffOrchestration
 
 # Load .env
 dotenv.load_dotenv()
@@ -39,14 +63,69 @@ CODEWRITER_NAME = "CodeWriter"
 CODEEXECUTOR_NAME = "CodeExecutor"
 CODE_REVIEWER_NAME = "CodeReviewer"
 APIBUILDER_NAME = "APIBUILDER"
-TERMINATION_KEYWORD = "yes"
+
+# "chat" re-decides the next agent every turn; "plan" compiles the request into a DAG of steps once;
+# "handoff" lets each agent pass control with its own transfer_to_<Agent> function calls
+ORCHESTRATION_MODE = "chat"
+MAX_HANDOFF_HOPS = 5
+
+# Local intent routing: seeded from selector_prompt.txt and past LLM routing decisions
+SELECTOR_PROMPT_PATH = "selector_prompt.txt"
+ROUTING_LOG_PATH = "routing_log.jsonl"
+ROUTER_CONFIDENCE_THRESHOLD = 0.6
+ROUTING_EXAMPLES = [
+    ("Write Python code for a ping pong game", CODEWRITER_NAME),
+    ("Draft a function that reverses a linked list", CODEWRITER_NAME),
+    ("Execute the code to verify it runs without errors", CODEEXECUTOR_NAME),
+    ("Review it to suggest improvements and optimizations", CODE_REVIEWER_NAME),
+    ("Review my code for performance and style", CODE_REVIEWER_NAME),
+    ("Publish the completed app as a REST API endpoint", APIBUILDER_NAME),
+]
+# Used when the routing decision names no valid agent and the router has no guess either
+AGENT_TRANSITIONS = {
+    CODEWRITER_NAME: CODEEXECUTOR_NAME,
+    CODEEXECUTOR_NAME: CODE_REVIEWER_NAME,
+}
+
+
+def safe_result_parser(decision: RoutingDecision, agents):
+    """Convert the routing decision into actual agent objects to call. Supports multiple agents in sequence."""
+    if not decision.requested:
+        return []
+    selected_agents = []
+    for name in decision.requested.split(","):
+        name = name.strip()
+        for agent in agents:
+            if agent.name.lower() == name.lower():
+                selected_agents.append(agent)
+                break
+    return selected_agents
+
+
+def termination_parser(decision: RoutingDecision):
+    """The request is complete once the decision says so ("done" already accepts true/yes/1)."""
+    return decision.done
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+def _create_router() -> IntentRouter:
+    examples = list(ROUTING_EXAMPLES)
+    try:
+        examples += load_prompt_examples(SELECTOR_PROMPT_PATH, {
+            "CODEWRITER_NAME": CODEWRITER_NAME,
+            "CODEEXECUTOR_NAME": CODEEXECUTOR_NAME,
+            "CODE_REVIEWER_NAME": CODE_REVIEWER_NAME,
+            "APIBUILDER_NAME": APIBUILDER_NAME,
+        })
+    except OSError as ex:
+        logging.warning(f"Could not read selector examples: {ex}")
+    examples += load_logged_decisions(ROUTING_LOG_PATH)
+    return IntentRouter(examples)
+
 def _create_kernel(service_id: str) -> Kernel:
     kernel = Kernel()
     kernel.add_service(
-        AzureChatCompletion(
+        create_chat_completion(
             service_id=service_id,
             endpoint=azure_openai_endpoint,
             deployment_name=azure_openai_deployment,
@@ -56,32 +135,6 @@ def _create_kernel(service_id: str) -> Kernel:
     kernel.add_plugin(plugin_name="LocalCodeExecutionTool", plugin=LocalPythonPlugin())
     return kernel
 
-def safe_result_parser(result, agents):
-    """
-    Convert LLM output into actual agent objects to call.
-    Supports multiple agents in sequence.
-    """
-    if not result.value:
-        return []
-    val = str(result.value).strip()
-    selected_agents = []
-
-    # Split by comma and normalize
-    for name in val.split(","):
-        name = name.strip()
-        for agent in agents:
-            if agent.name.lower() == name.lower():
-                selected_agents.append(agent)
-                break
-
-    return selected_agents
-
-def termination_parser(result):
-    if not result.value:
-        return False
-    val = str(result.value).strip()
-    return TERMINATION_KEYWORD.lower() in val.lower()
-
 async def main():
     # --- Agents ---
     writer = ChatCompletionAgent(
@@ -161,70 +214,157 @@ async def main():
 
     agents = [writer, executor, reviewer, apibuilder]
 
-    # --- Selection strategy ---
-    selection = KernelFunctionFromPrompt(
-        function_name="select_next",
+    # --- Combined selection + termination decision (one LLM call per turn) ---
+    decision = KernelFunctionFromPrompt(
+        function_name="route",
         prompt=f"""
-            You are a decision function.
-            Pick the required agent(s) based ONLY on the user's last message.
+            You are a decision function for a multi-agent chat.
             Valid names: {', '.join([a.name for a in agents])}
+            Decide whether the user's request has been fully completed and, if not, which agent acts next.
             - If user asks for code → {CODEWRITER_NAME}.
             - If user asks to execute code → {CODEEXECUTOR_NAME}.
             - If user asks for review → {CODE_REVIEWER_NAME}.
             - If user asks to build an API → {APIBUILDER_NAME}.
-            Return agent names comma-separated if multiple. No extra text.
-            User message: {{{{user_message}}}}
-        """
+            The request is done once the correct agent(s) have responded once with output/code.
+            Respond ONLY with JSON: {{"done": true|false, "next": "<agent name>"}}
+            Conversation history: {{{{$history}}}}
+        """,
+        prompt_execution_settings=AzureChatPromptExecutionSettings(
+            service_id="selector",
+            temperature=0.0,
+            max_tokens=50,
+            response_format={"type": "json_object"},
+        ),
+    )
+    decider = RoutingDecider(
+        function=decision,
+        kernel=_create_kernel("selector"),
+        agent_names=[a.name for a in agents],
+        agent_variable_name="agents",
+        history_variable_name="history",
+        history_reducer=PromptHistoryReducer(target_count=6, mode="compact"),
     )
 
-    # --- Termination strategy ---
-    termination = KernelFunctionFromPrompt(
-        function_name="check_done",
-        prompt=f"""
-            Determine if the user's request has been fully completed.
-            Say only "{TERMINATION_KEYWORD}" if:
-            - The correct agent(s) have responded once with output/code.
-            Otherwise, respond with anything else.
-            Conversation history: {{{{history}}}}
-        """
+    router = _create_router()
+    # Router guess on a user turn, the fixed transition after an agent's turn
+    routing_fallback = RouterGuessSelectionStrategy(
+        router=router,
+        fallback=TransitionTableSelectionStrategy(transitions=AGENT_TRANSITIONS),
+    )
+
+    cached_selection = CachedSelectionStrategy(
+        inner=CombinedDecisionSelectionStrategy(
+            decider=decider,
+            result_parser=safe_result_parser,
+            fallback=routing_fallback,
+        ),
+    )
+    cached_termination = CachedTerminationStrategy(
+        inner=CombinedDecisionTerminationStrategy(
+            agents=agents,
+            decider=decider,
+            result_parser=termination_parser,
+            fallback=routing_fallback,
+        ),
     )
 
     # --- Multi-agent chat ---
     chat = AgentGroupChat(
         agents=agents,
-        selection_strategy=KernelFunctionSelectionStrategy(
-            function=selection,
-            kernel=_create_kernel("selector"),
-            result_parser=lambda r: safe_result_parser(r, chat.agents),
-            agent_variable_name="agents",
-            history_variable_name="history",
+        # Local intent router first; the LLM routing decision only below the confidence threshold
+        selection_strategy=IntentRouterSelectionStrategy(
+            router=router,
+            fallback=cached_selection,
+            threshold=ROUTER_CONFIDENCE_THRESHOLD,
+            log_path=ROUTING_LOG_PATH,
         ),
-        termination_strategy=KernelFunctionTerminationStrategy(
+        termination_strategy=PredicateTerminationStrategy(
             agents=agents,
-            function=termination,
-            kernel=_create_kernel("terminator"),
-            result_parser=termination_parser,
-            history_variable_name="history",
+            # Hard stop once every agent could have replied; below that the routing decision's "done" decides
+            predicates=[agent_replied(times=len(agents))],
+            # Only consulted when every predicate is inconclusive; reuses the cached routing decision
+            fallback=cached_termination,
             maximum_iterations=10,
         ),
     )
 
+    # --- Plan-once DAG orchestration (only built in plan mode) ---
+    if ORCHESTRATION_MODE == "plan":
+        planner = Planner(
+            function=KernelFunctionFromPrompt(
+                function_name="plan",
+                prompt=PLANNER_PROMPT,
+                prompt_execution_settings=AzureChatPromptExecutionSettings(
+                    service_id="planner",
+                    temperature=0.0,
+                    max_tokens=500,
+                    response_format={"type": "json_object"},
+                ),
+            ),
+            kernel=_create_kernel("planner"),
+            agents=agents,
+        )
+        plan_orchestration = PlanOrchestration(planner=planner, agents=agents, max_replans=1)
+
+    # --- Agent-initiated handoffs (only registered in handoff mode: it adds transfer functions to every kernel) ---
+    if ORCHESTRATION_MODE == "handoff":
+        handoff_orchestration = HandoffOrchestration(agents=agents, max_hops=MAX_HANDOFF_HOPS)
+
+    # Open the pooled connections now instead of on each agent's first call
+    await warm_up()
+
     print("🎯 Multi-Agent Assistant Ready. Type your request below:")
     print("Type `exit` to quit or `reset` to restart.\n")
 
     while True:
         user_input = input("🧠 User:> ")
         if user_input.lower() == "exit":
+            logging.info(chat.selection_strategy.stats.summary())
+            logging.info(shared_decision_cache.summary())
+            logging.info(f"Routing decider: {decider.calls} LLM calls shared by selection and termination")
             break
         if user_input.lower() == "reset":
             await chat.reset()
+            decider.reset()
+            # Only this chat's decisions; the cache is shared with every other chat in the process
+            cached_selection.forget()
+            cached_termination.forget()
             print("🔁 Conversation reset.\n")
             continue
 
+        if ORCHESTRATION_MODE == "plan":
+            try:
+                await plan_orchestration.invoke(
+                    user_input,
+                    on_step=lambda r: print(f"\n🤖 {r.step.agent} [{r.step.id}]{' ❌' if r.failed else ''}:\n{r.content}\n"),
+                )
+                print("✅ Task complete.\n")
+                continue
+            except PlanError as ex:
+                # A bad plan is an ordinary LLM outcome; answer this request turn by turn instead
+                logging.warning(f"Planning failed, falling back to chat: {ex}")
+
+        if ORCHESTRATION_MODE == "handoff":
+            # Entry agent from the local router; every later hop is chosen by the agents themselves
+            initial, _ = router.classify(user_input)
+            result = await handoff_orchestration.invoke(user_input, initial_agent=initial or CODEWRITER_NAME)
+            for message in result.messages[1:]:
+                print(f"\n🤖 {message.name}:\n{message.content}\n")
+            if result.trace:
+                print("🔀 Hops: " + " → ".join([result.trace[0].from_agent] + [h.to_agent for h in result.trace]))
+            print("✅ Task complete.\n")
+            continue
+
         await chat.add_chat_message(ChatMessageContent(role=AuthorRole.USER, content=user_input))
 
-        async for response in chat.invoke():
-            print(f"\n🤖 {response.name}:\n{response.content}\n")
+        try:
+            async for response in chat.invoke():
+                print(f"\n🤖 {response.name}:\n{response.content}\n")
+        except (AgentChatException, AgentExecutionException) as ex:
+            # Keep the REPL alive; the next request starts from the same history
+            logging.error(f"Chat turn failed: {ex}")
+            print(f"❌ {ex}\n")
+            continue
 
         if chat.is_complete:
             print("✅ Task complete.\n")
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import os
+import time
+
+from azure.core.credentials import AccessToken
+from azure.identity.aio import (
+    AzureCliCredential,
+    DefaultAzureCredential,
+    EnvironmentCredential,
+    ManagedIdentityCredential,
+    WorkloadIdentityCredential,
+)
+
+logger = logging.getLogger(__name__)
+
+MANAGEMENT_SCOPE = "https://management.azure.com/.default"
+SESSION_POOL_SCOPE = "https://dynamicsessions.io/.default"
+
+# Refresh this long before expiry so callers never wait on the identity endpoint
+REFRESH_MARGIN_SECONDS = 300
+MIN_REFRESH_INTERVAL_SECONDS = 60
+
+# AZURE_CREDENTIAL_TYPE pins one credential so cold start does not probe the whole DefaultAzureCredential chain
+CREDENTIAL_TYPES = {
+    "default": DefaultAzureCredential,
+    "managed_identity": ManagedIdentityCredential,
+    "workload_identity": WorkloadIdentityCredential,
+    "environment": EnvironmentCredential,
+    "cli": AzureCliCredential,
+}
+
+
+def create_credential(credential_type: str | None = None):
+    credential_type = (credential_type or os.getenv("AZURE_CREDENTIAL_TYPE", "default")).lower()
+    if credential_type not in CREDENTIAL_TYPES:
+        raise ValueError(f"Unknown AZURE_CREDENTIAL_TYPE '{credential_type}', expected one of {sorted(CREDENTIAL_TYPES)}")
+    client_id = os.getenv("AZURE_CLIENT_ID")
+    if credential_type == "managed_identity" and client_id:
+        return ManagedIdentityCredential(client_id=client_id)
+    return CREDENTIAL_TYPES[credential_type]()
+
+
+class TokenManager:
+    """
+    Caches one access token per scope and refreshes it in the background `refresh_margin` seconds
+    before it expires. Concurrent callers that find no usable token share a single refresh.
+    """
+
+    def __init__(self, credential_type: str | None = None, refresh_margin: float = REFRESH_MARGIN_SECONDS):
+        self.credential_type = credential_type
+        self.refresh_margin = refresh_margin
+        self._credential = None
+        self._tokens: dict[str, AccessToken] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+
+    def _get_credential(self):
+        # Built on first use rather than at import
+        if self._credential is None:
+            self._credential = create_credential(self.credential_type)
+        return self._credential
+
+    async def get_token(self, scope: str) -> str:
+        token = self._tokens.get(scope)
+        now = time.time()
+        if token is not None and token.expires_on - now > self.refresh_margin:
+            return token.token
+        if token is not None and token.expires_on > now:
+            if scope not in self._timers:
+                # Still valid and no refresh scheduled: hand it out and let the refresh run behind it
+                self._refresh(scope)
+            return token.token
+        # Shielded so one cancelled caller does not cancel the refresh the others are waiting on
+        return (await asyncio.shield(self._refresh(scope))).token
+
+    async def prefetch(self, *scopes: str) -> None:
+        """Fetch tokens ahead of the first request (e.g. on worker start). Failures are logged and retried on use."""
+        await asyncio.gather(*(self.get_token(s) for s in scopes), return_exceptions=True)
+
+    def _refresh(self, scope: str) -> asyncio.Task:
+        task = self._inflight.get(scope)
+        if task is None:
+            task = asyncio.create_task(self._fetch(scope))
+            self._inflight[scope] = task
+            task.add_done_callback(lambda t: self._refresh_done(scope, t))
+        return task
+
+    def _refresh_done(self, scope: str, task: asyncio.Task) -> None:
+        self._inflight.pop(scope, None)
+        # Failures are logged in _fetch; the next get_token retries
+        if not task.cancelled():
+            task.exception()
+
+    async def _fetch(self, scope: str) -> AccessToken:
+        started = time.perf_counter()
+        try:
+            token = await self._get_credential().get_token(scope)
+        except Exception as ex:
+            logger.error(f"Failed to obtain token for {scope}: {ex}")
+            raise
+        self._tokens[scope] = token
+        logger.info(f"Fetched token for {scope} in {time.perf_counter() - started:.2f}s, expires in {token.expires_on - time.time():.0f}s")
+        self._schedule(scope, token)
+        return token
+
+    def _schedule(self, scope: str, token: AccessToken) -> None:
+        timer = self._timers.pop(scope, None)
+        if timer is not None:
+            timer.cancel()
+        remaining = token.expires_on - time.time()
+        # Tokens that live shorter than the margin would otherwise be refreshed in a tight loop
+        delay = max(remaining - self.refresh_margin, min(remaining / 2, MIN_REFRESH_INTERVAL_SECONDS), 0)
+        self._timers[scope] = asyncio.get_running_loop().call_later(delay, self._background_refresh, scope)
+
+    def _background_refresh(self, scope: str) -> None:
+        self._timers.pop(scope, None)
+        self._refresh(scope)
+
+    async def aclose(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._credential is not None:
+            await self._credential.close()
+            self._credential = None
+
+
+_manager: TokenManager | None = None
+
+
+def get_token_manager() -> TokenManager:
+    global _manager
+    if _manager is None:
+        _manager = TokenManager()
+    return _manager
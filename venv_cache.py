@@ -0,0 +1,247 @@
+import ast
+import asyncio
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+VENV_CACHE_DIR = os.getenv("VENV_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "agent-venvs"))
+# Local directory of wheels; when set, installs never touch the network
+WHEELHOUSE_DIR = os.getenv("WHEELHOUSE_DIR")
+# Without a wheelhouse, only these distributions may be installed from the package index: the names
+# come from generated code, and installing whatever it imports from PyPI runs untrusted setup code
+VENV_ALLOWED_DISTRIBUTIONS = frozenset(
+    d.strip() for d in os.getenv("VENV_ALLOWED_DISTRIBUTIONS", "").split(",") if d.strip()
+)
+VENV_CACHE_MAX_BYTES = int(os.getenv("VENV_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+READY_FILE = ".ready.json"
+
+# Import names that differ from the distribution that provides them
+IMPORT_TO_DISTRIBUTION = {
+    "bs4": "beautifulsoup4",
+    "cv2": "opencv-python",
+    "dateutil": "python-dateutil",
+    "dotenv": "python-dotenv",
+    "docx": "python-docx",
+    "fitz": "pymupdf",
+    "jwt": "pyjwt",
+    "PIL": "pillow",
+    "pptx": "python-pptx",
+    "serial": "pyserial",
+    "skimage": "scikit-image",
+    "sklearn": "scikit-learn",
+    "yaml": "pyyaml",
+}
+
+
+def imported_modules(code: str) -> set[str]:
+    """Top-level names of absolute imports in `code`."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(a.name.split(".")[0] for a in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split(".")[0])
+    return names
+
+
+def required_distributions(code: str) -> tuple[str, ...]:
+    """Distributions the code imports that the base interpreter does not already provide."""
+    missing = []
+    for name in imported_modules(code):
+        if name in sys.stdlib_module_names or name == "__future__":
+            continue
+        if importlib.util.find_spec(name) is not None:
+            continue
+        missing.append(IMPORT_TO_DISTRIBUTION.get(name, name).lower())
+    return tuple(sorted(set(missing)))
+
+
+def _canonical(distribution: str) -> str:
+    return re.sub(r"[-_.]+", "-", distribution).lower()
+
+
+def _base_site_dirs() -> list[str]:
+    return [p for p in sys.path if os.path.basename(p) in ("site-packages", "dist-packages") and os.path.isdir(p)]
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.lstat(os.path.join(root, f)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class VenvCache:
+    """
+    Ready-made virtualenvs keyed by the hash of their dependency set, reused across runs.
+    Each venv layers the missing distributions over the base interpreter's packages, installed
+    from `wheelhouse` without network access when one is configured, otherwise from the index but
+    only when every distribution is in `allowed`. Least recently used venvs are deleted once the
+    cache exceeds `max_bytes` on disk, except venvs a running program is using.
+    """
+
+    def __init__(
+        self,
+        root: str = VENV_CACHE_DIR,
+        wheelhouse: str | None = WHEELHOUSE_DIR,
+        max_bytes: int = VENV_CACHE_MAX_BYTES,
+        allowed: frozenset[str] = VENV_ALLOWED_DISTRIBUTIONS,
+    ):
+        self.root = root
+        self.wheelhouse = wheelhouse
+        self.max_bytes = max_bytes
+        self.allowed = frozenset(_canonical(d) for d in allowed)
+        self._building: dict[str, asyncio.Task] = {}
+        # Venvs in use by a running program, with their user count; eviction skips them
+        self._pinned: dict[str, int] = {}
+
+    @staticmethod
+    def key(distributions: tuple[str, ...]) -> str:
+        h = hashlib.sha256(sys.version.encode("utf-8"))
+        h.update("\x1f".join(distributions).encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    @staticmethod
+    def _python(venv: str) -> str:
+        return os.path.join(venv, "Scripts", "python.exe") if os.name == "nt" else os.path.join(venv, "bin", "python")
+
+    async def ensure(self, distributions: tuple[str, ...]) -> str:
+        """
+        Path to a python that has `distributions`, building and caching its venv on first use.
+        The venv is pinned against eviction until `release(distributions)`.
+        """
+        key = self.key(distributions)
+        venv = os.path.join(self.root, key)
+        ready = os.path.join(venv, READY_FILE)
+        self._pinned[key] = self._pinned.get(key, 0) + 1
+        try:
+            if os.path.exists(ready):
+                os.utime(ready)  # last-used time for eviction
+                return self._python(venv)
+            self._check_allowed(distributions)
+            # Concurrent runs needing the same set share one build
+            task = self._building.get(key)
+            if task is None:
+                task = asyncio.create_task(self._build(key, distributions))
+                self._building[key] = task
+                task.add_done_callback(lambda _: self._building.pop(key, None))
+            await asyncio.shield(task)
+            return self._python(venv)
+        except BaseException:
+            self.release(distributions)
+            raise
+
+    def release(self, distributions: tuple[str, ...]) -> None:
+        """The program that called `ensure(distributions)` is done with the venv."""
+        key = self.key(distributions)
+        self._pinned[key] -= 1
+        if not self._pinned[key]:
+            del self._pinned[key]
+
+    def _check_allowed(self, distributions: tuple[str, ...]) -> None:
+        if self.wheelhouse:
+            return
+        disallowed = [d for d in distributions if _canonical(d) not in self.allowed]
+        if disallowed:
+            raise RuntimeError(
+                f"Not installing {', '.join(disallowed)} from the package index: "
+                "set WHEELHOUSE_DIR, or list them in VENV_ALLOWED_DISTRIBUTIONS"
+            )
+
+    async def _build(self, key: str, distributions: tuple[str, ...]) -> None:
+        venv = os.path.join(self.root, key)
+        staging = f"{venv}.building-{os.getpid()}"
+        os.makedirs(self.root, exist_ok=True)
+        await asyncio.to_thread(shutil.rmtree, staging, True)
+        started = time.perf_counter()
+        try:
+            await self._check(sys.executable, "-m", "venv", staging)
+            # Layer over the base interpreter's packages (also when it is itself a venv, which
+            # --system-site-packages would skip); the venv's own site-packages still comes first
+            purelib = (await self._check(
+                self._python(staging), "-c", "import sysconfig; print(sysconfig.get_paths()['purelib'])"
+            )).strip()
+            with open(os.path.join(purelib, "_base_site.pth"), "w", encoding="utf-8") as f:
+                f.write("\n".join(_base_site_dirs()) + "\n")
+            pip = [self._python(staging), "-m", "pip", "install", "--disable-pip-version-check", "--quiet"]
+            if self.wheelhouse:
+                pip += ["--no-index", "--find-links", self.wheelhouse]
+            await self._check(*pip, *distributions)
+        except BaseException:
+            await asyncio.shield(asyncio.to_thread(shutil.rmtree, staging, True))
+            raise
+        # Only console scripts embed the staging path; the venv's python finds its site-packages relative to itself
+        try:
+            os.replace(staging, venv)
+        except OSError:
+            # Another worker process finished the same venv first
+            await asyncio.to_thread(shutil.rmtree, staging, True)
+            return
+        # Walking and deleting venv trees is slow disk work; keep it off the event loop
+        size = await asyncio.to_thread(_dir_size, venv)
+        with open(os.path.join(venv, READY_FILE), "w", encoding="utf-8") as f:
+            json.dump({"distributions": distributions, "bytes": size}, f)
+        logger.info(f"Built venv {key} for {', '.join(distributions)} in {time.perf_counter() - started:.1f}s")
+        await asyncio.to_thread(self.evict, frozenset(self._pinned) | {key})
+
+    @staticmethod
+    async def _check(*args: str) -> str:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        output, _ = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"{' '.join(args[:4])} ... failed: {output.decode(errors='replace')[-2000:]}")
+        return output.decode(errors="replace")
+
+    def evict(self, keep: frozenset[str] = frozenset()) -> None:
+        """
+        Delete least recently used venvs, other than those in `keep`, until the cache fits in
+        `max_bytes` (blocking; run it in a thread).
+        """
+        entries = []
+        for key in os.listdir(self.root):
+            ready = os.path.join(self.root, key, READY_FILE)
+            if not os.path.exists(ready):
+                continue
+            try:
+                with open(ready, encoding="utf-8") as f:
+                    size = json.load(f).get("bytes", 0)
+            except (OSError, json.JSONDecodeError):
+                size = 0
+            entries.append((os.path.getmtime(ready), key, size))
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            total -= size
+            logger.info(f"Evicted venv {key} ({size / 1024 ** 2:.0f} MiB)")
+
+
+_cache: VenvCache | None = None
+
+
+def get_venv_cache() -> VenvCache:
+    global _cache
+    if _cache is None:
+        _cache = VenvCache()
+    return _cache